@@ -1 +1,6 @@
-from .vcoclient import VcoClient
\ No newline at end of file
+from .vcoclient import VcoClient
+from .cache import FileCache
+from .capture import CaptureWriter, ReplayTransport
+from .tracing import Tracer, FileExporter, CollectorExporter
+from .fleet import TopN, rank_applications
+from .query import Query, QueryPlanner
@@ -0,0 +1,292 @@
+import logging
+from collections import namedtuple
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+LINK_HEALTH_METRICS = ('bestLatencyMsRx', 'bestLatencyMsTx',
+                       'bestLossPctRx', 'bestLossPctTx',
+                       'bestJitterMsRx', 'bestJitterMsTx')
+
+Anomaly = namedtuple('Anomaly', ['link', 'metric', 'timestamp', 'value',
+                                 'mean', 'std', 'zscore', 'quantile'])
+Anomaly.__doc__ = """
+A link metric sample that is both far above its EWMA and above its rolling
+upper quantile. link is the (edge_id, link_id) the sample came from
+"""
+
+def _link_id(link: dict):
+    """
+    Returns the linkId of a link series entry, falling back to its interface
+    name so links without an id are not merged together
+    """
+    link_id = link.get('linkId')
+    if link_id is None:
+        link_id = (link.get('link') or {}).get('interface')
+    return link_id
+
+def _passes(rows: np.ndarray) -> list:
+    """
+    Splits positions into passes in which each row appears at most once
+
+    Assigning through self._mean[rows] keeps only the last write to a
+    repeated row, so repeats are updated in later passes, in order.
+    """
+    if len(np.unique(rows)) == len(rows):
+        return [np.arange(len(rows))]
+
+    seen = {}
+    occurrence = np.empty(len(rows), dtype=np.int64)
+    for position, row in enumerate(rows.tolist()):
+        occurrence[position] = seen[row] = seen.get(row, -1) + 1
+    return [np.nonzero(occurrence == number)[0] for number in range(occurrence.max() + 1)]
+
+class LinkHealthDetector:
+    """
+    Streaming anomaly detector for WAN link latency, loss and jitter
+
+    Keeps an exponentially weighted mean and variance and a streaming estimate
+    of an upper quantile for every (link, metric). State is a fixed number of
+    floats per link held in arrays, so each polling cycle updates every link
+    with a handful of vectorized numpy operations.
+
+    A sample is anomalous once its (link, metric) has seen warmup samples,
+    when its z-score against the EWMA is above threshold and it exceeds the rolling
+    quantile estimate.
+
+    ...
+
+    Attributes:
+    -----------
+    metrics : tuple
+        Link series metrics that are tracked
+    alpha : float
+        EWMA smoothing factor (0 - 1). Higher values adapt faster
+    quantile : float
+        The upper quantile (0 - 1) tracked for each metric
+    quantile_rate : float
+        Step size of the quantile estimate, as a fraction of the EWMA standard
+        deviation
+    threshold : float
+        z-score above which a sample may be anomalous
+    warmup : int
+        Samples a metric of a link must see before it can report anomalies
+    min_std : float
+        Floor applied to the standard deviation so flat series do not report
+        every small change
+
+    """
+    def __init__(self,
+                 metrics: tuple = LINK_HEALTH_METRICS,
+                 alpha: float = 0.1,
+                 quantile: float = 0.99,
+                 quantile_rate: float = 0.05,
+                 threshold: float = 4.0,
+                 warmup: int = 12,
+                 min_std: float = 1.0,
+                 capacity: int = 1024):
+        self.metrics = tuple(metrics)
+        self.alpha = alpha
+        self.quantile = quantile
+        self.quantile_rate = quantile_rate
+        self.threshold = threshold
+        self.warmup = warmup
+        self.min_std = min_std
+
+        self._index = {}
+        self._keys = []
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        width = len(self.metrics)
+        old = getattr(self, '_mean', None)
+
+        mean = np.zeros((capacity, width))
+        var = np.zeros((capacity, width))
+        upper = np.zeros((capacity, width))
+        count = np.zeros((capacity, width), dtype=np.int64)
+
+        if old is not None:
+            size = len(old)
+            mean[:size] = self._mean[:size]
+            var[:size] = self._var[:size]
+            upper[:size] = self._upper[:size]
+            count[:size] = self._count[:size]
+
+        self._mean, self._var, self._upper, self._count = mean, var, upper, count
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def _rows(self, keys: list) -> np.ndarray:
+        """
+        Returns the state row for each link key, adding rows for new links
+        """
+        index = self._index
+        rows = np.empty(len(keys), dtype=np.int64)
+        for position, key in enumerate(keys):
+            row = index.get(key)
+            if row is None:
+                row = index[key] = len(self._keys)
+                self._keys.append(key)
+            rows[position] = row
+
+        if len(self._keys) > len(self._count):
+            self._allocate(max(len(self._keys), 2 * len(self._count)))
+        return rows
+
+    def state(self, link) -> dict:
+        """
+        Returns the current mean, std and quantile of each metric for a link
+        """
+        row = self._index[link]
+        return {metric: {'mean': self._mean[row, column],
+                         'std': np.sqrt(self._var[row, column]),
+                         'quantile': self._upper[row, column]}
+                for column, metric in enumerate(self.metrics)}
+
+    def update(self, links: list, values, timestamps=None) -> list:
+        """
+        Updates every link with one sample per metric
+
+            Parameters:
+                links (list): Link keys, e.g. (edge_id, link_id). A key that
+                              appears more than once is updated with each
+                              of its samples in order
+                values (array): A (len(links), len(metrics)) array of samples.
+                                NaN marks a missing sample
+                timestamps (array): Optional sample time for each link
+
+            Returns:
+                (list) The Anomaly records found in this update
+        """
+        rows = self._rows(links)
+        values = np.asarray(values, dtype=float)
+        if timestamps is not None:
+            timestamps = np.asarray(timestamps)
+
+        found = []
+        for positions in _passes(rows):
+            found.extend(self._update(rows[positions],
+                                      values[positions],
+                                      None if timestamps is None else timestamps[positions]))
+        return found
+
+    def _update(self, rows: np.ndarray, values: np.ndarray, timestamps) -> list:
+        mean = self._mean[rows]
+        var = self._var[rows]
+        upper = self._upper[rows]
+        count = self._count[rows]
+
+        valid = ~np.isnan(values)
+        first = valid & (count == 0)
+        std = np.maximum(np.sqrt(var), self.min_std)
+
+        with np.errstate(invalid='ignore'):
+            zscore = (values - mean) / std
+            anomalous = (valid
+                         & (count >= self.warmup)
+                         & (zscore > self.threshold)
+                         & (values > upper))
+
+            # Exponentially weighted mean and variance
+            diff = np.where(valid, values - mean, 0.0)
+            step = self.alpha * diff
+            new_mean = mean + step
+            new_var = (1 - self.alpha) * (var + diff * step)
+
+            # Stochastic quantile estimate: move up by q or down by (1 - q)
+            # steps so it settles where a fraction q of samples are below it
+            below = values <= upper
+            direction = np.where(below, -(1 - self.quantile), self.quantile)
+            new_upper = np.where(valid, upper + self.quantile_rate * std * direction, upper)
+
+        self._mean[rows] = np.where(first, values, new_mean)
+        self._var[rows] = np.where(first, 0.0, new_var)
+        self._upper[rows] = np.where(first, values, new_upper)
+        self._count[rows] = count + valid
+
+        found = []
+        for position, column in zip(*np.nonzero(anomalous)):
+            found.append(Anomaly(link=self._keys[rows[position]],
+                                 metric=self.metrics[column],
+                                 timestamp=None if timestamps is None else int(timestamps[position]),
+                                 value=float(values[position, column]),
+                                 mean=float(mean[position, column]),
+                                 std=float(std[position, column]),
+                                 zscore=float(zscore[position, column]),
+                                 quantile=float(upper[position, column])))
+        return found
+
+    def feed(self, edge_id: int, series: list) -> list:
+        """
+        Updates the detector from a VcoClient.get_edge_link_series() response
+        """
+        return self.feed_many([(edge_id, series)])
+
+    def feed_many(self, responses: list) -> list:
+        """
+        Updates the detector from many get_edge_link_series() responses at once
+
+        Links from every response are stacked so that each time step updates
+        all of them in a single vectorized pass. A link that appears in more
+        than one response, e.g. two polls of the same edge, is updated with
+        each response in turn.
+
+            Parameters:
+                responses (list): (edge_id, series) pairs, where series is a
+                                  get_edge_link_series() response
+
+            Returns:
+                (list) The Anomaly records found, in time order
+        """
+        links, samples, starts, ticks = [], [], [], []
+        for edge_id, series in responses:
+            for link in series or []:
+                links.append((edge_id, _link_id(link)))
+                start, tick, columns = self._columns(link.get('series', []))
+                samples.append(columns)
+                starts.append(start)
+                ticks.append(tick)
+
+        if not links:
+            return []
+
+        steps = max(columns.shape[0] for columns in samples)
+        values = np.full((len(links), steps, len(self.metrics)), np.nan)
+        for position, columns in enumerate(samples):
+            values[position, :columns.shape[0]] = columns
+
+        starts = np.asarray(starts, dtype=np.int64)
+        ticks = np.asarray(ticks, dtype=np.int64)
+        rows = self._rows(links)
+
+        found = []
+        for positions in _passes(rows):
+            for step in range(steps):
+                found.extend(self._update(rows[positions],
+                                          values[positions, step],
+                                          starts[positions] + step * ticks[positions]))
+        return found
+
+    def _columns(self, series: list) -> tuple:
+        """
+        Returns (start, tick, samples) for a link, where samples is a
+        (points, len(metrics)) array with NaN for metrics that are absent
+        """
+        by_metric = {item.get('metric'): item for item in series}
+        points = max((len(item.get('data') or []) for item in series), default=0)
+        columns = np.full((points, len(self.metrics)), np.nan)
+
+        start, tick = 0, 0
+        for column, metric in enumerate(self.metrics):
+            item = by_metric.get(metric)
+            if item is None:
+                continue
+            data = np.array(item.get('data') or [], dtype=float)
+            columns[:len(data), column] = data
+            start = item.get('startTime', start)
+            tick = item.get('tickInterval', tick)
+
+        return start, tick, columns
@@ -0,0 +1,151 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from .anomaly import LinkHealthDetector
+
+def link_series(link_id, latency, start=1617530400000, tick=300000):
+    """
+    Builds a get_edge_link_series() style entry for one link
+    """
+    return {"linkId" : link_id,
+            "series" : [{"metric" : "bestLatencyMsRx",
+                         "startTime" : start,
+                         "tickInterval" : tick,
+                         "data" : latency},
+                        {"metric" : "bytesRx",
+                         "startTime" : start,
+                         "tickInterval" : tick,
+                         "data" : [0] * len(latency)}]}
+
+def test_update_spike():
+    """
+    Testing that a spike after warmup is reported once
+    """
+    detector = LinkHealthDetector(metrics=('latency', 'loss'), warmup=5)
+    rng = np.random.default_rng(0)
+
+    found = []
+    for _ in range(50):
+        values = np.column_stack([20 + rng.normal(0, 1, 3), np.zeros(3)])
+        found.extend(detector.update(['a', 'b', 'c'], values))
+    assert found == []
+
+    found = detector.update(['a', 'b', 'c'], [[20, 0], [200, 0], [21, 0]])
+
+    assert len(found) == 1
+    assert found[0].link == 'b'
+    assert found[0].metric == 'latency'
+    assert found[0].value == 200
+    assert found[0].zscore > detector.threshold
+
+def test_update_warmup():
+    """
+    Testing that links do not report anomalies before warmup
+    """
+    detector = LinkHealthDetector(metrics=('latency',), warmup=3)
+
+    assert detector.update(['a'], [[10]]) == []
+    assert detector.update(['a'], [[1000]]) == []
+
+def test_update_late_metric():
+    """
+    Testing that a metric first reported after warmup warms up on its own
+    """
+    detector = LinkHealthDetector(metrics=('latency', 'jitter'), warmup=3)
+    for _ in range(5):
+        assert detector.update(['a'], [[20, np.nan]]) == []
+
+    assert detector.update(['a'], [[20, 15]]) == []
+    assert detector.state('a')['jitter']['mean'] == 15
+
+def test_update_missing_samples():
+    """
+    Testing that NaN samples leave a metric's state untouched
+    """
+    detector = LinkHealthDetector(metrics=('latency', 'loss'))
+    detector.update(['a'], [[10, 1]])
+    detector.update(['a'], [[np.nan, 3]])
+
+    state = detector.state('a')
+
+    assert state['latency']['mean'] == 10
+    assert state['loss']['mean'] > 1
+
+def test_quantile_converges():
+    """
+    Testing that the rolling quantile settles near the requested quantile
+    """
+    detector = LinkHealthDetector(metrics=('latency',), quantile=0.9,
+                                  quantile_rate=0.05, min_std=0.1)
+    rng = np.random.default_rng(1)
+    samples = rng.normal(50, 5, 20000)
+
+    for sample in samples:
+        detector.update(['a'], [[sample]])
+
+    assert abs(detector.state('a')['latency']['quantile'] - np.quantile(samples, 0.9)) < 1.5
+
+def test_capacity_growth():
+    """
+    Testing that state grows past the initial capacity without losing links
+    """
+    detector = LinkHealthDetector(metrics=('latency',), capacity=2)
+    detector.update(['a'], [[5]])
+    detector.update(list('bcdef'), np.ones((5, 1)))
+
+    assert len(detector) == 6
+    assert detector.state('a')['latency']['mean'] == 5
+
+def test_feed_many():
+    """
+    Testing updating from get_edge_link_series() responses across edges
+    """
+    detector = LinkHealthDetector(warmup=5)
+    steady = [20.0, 21.0, 20.0, 19.0] * 5
+
+    found = detector.feed_many([
+        (1, [link_series(100, steady + [300.0]), link_series(101, steady + [20.0])]),
+        (2, [link_series(200, steady[:10])]),
+    ])
+
+    assert len(detector) == 3
+    assert [(anomaly.link, anomaly.metric) for anomaly in found] == [((1, 100), 'bestLatencyMsRx')]
+    assert found[0].timestamp == 1617530400000 + 20 * 300000
+
+    assert detector.feed(1, []) == []
+
+def test_update_repeated_link():
+    """
+    Testing that every sample of a link repeated in one update is applied
+    """
+    detector = LinkHealthDetector(metrics=('latency',), alpha=0.5)
+    detector.update(['a', 'b', 'a'], [[10], [5], [20]], timestamps=[1, 1, 2])
+
+    assert detector._count[detector._index['a']].tolist() == [2]
+    assert detector.state('a')['latency']['mean'] == 15
+    assert detector.state('b')['latency']['mean'] == 5
+
+def test_feed_many_repeated_polls():
+    """
+    Testing two polls of the same edge, with links that have no linkId
+    """
+    def unnamed(interface, latency, start):
+        link = link_series(None, latency, start=start)
+        del link['linkId']
+        link['link'] = {'interface' : interface}
+        return link
+
+    detector = LinkHealthDetector(warmup=5)
+    steady = [20.0, 21.0, 20.0, 19.0] * 3
+    later = 1617530400000 + len(steady) * 300000
+
+    found = detector.feed_many([
+        (1, [unnamed('GE1', steady, 1617530400000), unnamed('GE2', steady, 1617530400000)]),
+        (1, [unnamed('GE1', steady + [300.0], later), unnamed('GE2', steady, later)]),
+    ])
+
+    assert len(detector) == 2
+    assert detector._count[detector._index[(1, 'GE1')]][0] == 2 * len(steady) + 1
+    assert [anomaly.link for anomaly in found] == [(1, 'GE1')]
+    assert found[0].timestamp == later + len(steady) * 300000
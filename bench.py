@@ -0,0 +1,284 @@
+"""
+Throughput benchmarks for VcoClient against a local mock orchestrator
+
+Run with:
+
+    python -m vcoclient.bench --latency 0.02 --calls 200
+
+Alongside throughput it measures cold start: import time and time to the
+first response, each in a fresh interpreter.
+"""
+import os
+import sys
+import json
+import time
+import subprocess
+import argparse
+import tracemalloc
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.exceptions import HTTPError
+
+from .vcoclient import VcoClient
+from .mockserver import MockOrchestrator
+
+APIKEY = 'benchmark'
+
+class BenchResult:
+    """
+    Timings collected from a single benchmark
+
+    ...
+
+    Attributes:
+    -----------
+    name : str
+        Name of the benchmark
+    elapsed : float
+        Wall clock seconds taken by the whole benchmark
+    latencies : list
+        Seconds taken by each call
+    errors : int
+        Number of calls that raised an HTTPError
+    peak_memory : int
+        Peak bytes allocated while running the benchmark, if measured
+
+    """
+    def __init__(self, name: str, elapsed: float, latencies: list, errors: int):
+        self.name = name
+        self.elapsed = elapsed
+        self.latencies = sorted(latencies)
+        self.errors = errors
+        self.peak_memory = None
+
+    @property
+    def calls(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def rps(self) -> float:
+        return self.calls / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, pct: float) -> float:
+        """
+        Returns the latency at the given percentile (0 - 100) using nearest rank
+        """
+        if not self.latencies:
+            return 0.0
+        rank = max(0, min(self.calls - 1, round(pct / 100 * self.calls) - 1))
+        return self.latencies[rank]
+
+    @property
+    def p50(self) -> float:
+        return self.percentile(50)
+
+    @property
+    def p99(self) -> float:
+        return self.percentile(99)
+
+    def __str__(self) -> str:
+        memory = '-' if self.peak_memory is None else f'{self.peak_memory / 2 ** 20:.1f}'
+        return (f'{self.name:<14} {self.calls:>7} {self.errors:>7} {self.rps:>9.1f} '
+                f'{self.p50 * 1000:>9.2f} {self.p99 * 1000:>9.2f} {memory:>9}')
+
+HEADER = (f'{"benchmark":<14} {"calls":>7} {"errors":>7} {"req/s":>9} '
+          f'{"p50 ms":>9} {"p99 ms":>9} {"peak MiB":>9}')
+
+
+def _timed(func, *args) -> tuple:
+    """
+    Calls func and returns (latency, failed)
+    """
+    started = time.perf_counter()
+    try:
+        func(*args)
+    except HTTPError:
+        return time.perf_counter() - started, True
+    return time.perf_counter() - started, False
+
+def _setup_call(func, *args, attempts: int = 5):
+    """
+    Calls func while preparing a benchmark, retrying errors so that injected
+    500s and 429s are only counted against the calls being measured
+    """
+    for attempt in range(attempts):
+        try:
+            return func(*args)
+        except HTTPError as err:
+            if attempt == attempts - 1:
+                raise
+            retry_after = err.response.headers.get('Retry-After')
+            time.sleep(float(retry_after) if retry_after else 0)
+
+def _run(name: str, calls: list, workers: int = 1) -> BenchResult:
+    """
+    Runs a list of (func, args) calls, optionally across a thread pool
+    """
+    started = time.perf_counter()
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(lambda call: _timed(call[0], *call[1]), calls))
+    else:
+        results = [_timed(func, *args) for func, args in calls]
+    elapsed = time.perf_counter() - started
+
+    return BenchResult(name,
+                       elapsed,
+                       [latency for latency, _ in results],
+                       sum(failed for _, failed in results))
+
+def bench_single(client: VcoClient, calls: int = 100) -> BenchResult:
+    """
+    Sequential get_enterprise_edges calls
+    """
+    return _run('single', [(client.get_enterprise_edges, (1,))] * calls)
+
+def bench_fanout(client: VcoClient, workers: int = 8, hours: int = 1) -> BenchResult:
+    """
+    get_edge_link_series for every edge of every enterprise, across a thread pool
+    """
+    end = datetime(2021, 4, 4)
+    start = end - timedelta(hours=hours)
+
+    calls = []
+    for enterprise in _setup_call(client.get_enterprise_proxy_enterprises):
+        for edge in _setup_call(client.get_enterprise_edges, enterprise['id']):
+            calls.append((client.get_edge_link_series, (edge['id'], start, end, enterprise['id'])))
+
+    return _run('fanout', calls, workers=workers)
+
+def bench_long_series(client: VcoClient, days: int = 7, calls: int = 5) -> BenchResult:
+    """
+    get_edge_app_series for a single edge over a long interval
+    """
+    end = datetime(2021, 4, 4)
+    start = end - timedelta(days=days)
+
+    return _run('long-series', [(client.get_edge_app_series, (1, start, end, 1))] * calls)
+
+_STARTUP_SCRIPT = """
+import json, time
+started = time.perf_counter()
+from {package} import VcoClient
+imported = time.perf_counter()
+from requests.exceptions import HTTPError
+try:
+    VcoClient({url!r}, api_key={apikey!r}).get_enterprise_edges(1)
+except HTTPError:
+    # An injected error is still a response
+    pass
+print(json.dumps([imported - started, time.perf_counter() - imported]))
+"""
+
+def bench_startup(url: str, runs: int = 5) -> list:
+    """
+    Import time and time to first response, each in a fresh interpreter
+
+        Returns:
+            (list) BenchResults for the import and the first call
+    """
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    script = _STARTUP_SCRIPT.format(package=__package__, url=url, apikey=APIKEY)
+
+    imports, first_calls = [], []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', script],
+                                cwd=os.path.dirname(package_dir),
+                                capture_output=True,
+                                check=True,
+                                text=True).stdout
+        imported, first_call = json.loads(output)
+        imports.append(imported)
+        first_calls.append(first_call)
+
+    return [BenchResult('import', sum(imports), imports, 0),
+            BenchResult('first-call', sum(first_calls), first_calls, 0)]
+
+STARTUP_HEADER = f'{"startup":<14} {"runs":>7} {"p50 ms":>9} {"p99 ms":>9}'
+
+def _startup_row(result: BenchResult) -> str:
+    return f'{result.name:<14} {result.calls:>7} {result.p50 * 1000:>9.2f} {result.p99 * 1000:>9.2f}'
+
+def _measure(bench, client: VcoClient, memory: bool, **kwargs) -> BenchResult:
+    """
+    Runs a benchmark, then optionally runs it again under tracemalloc so that
+    tracing overhead does not distort the timings
+    """
+    result = bench(client, **kwargs)
+    if memory:
+        tracemalloc.start()
+        try:
+            bench(client, **kwargs)
+            result.peak_memory = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+def run(mock: MockOrchestrator,
+        calls: int = 100,
+        workers: int = 8,
+        days: int = 7,
+        memory: bool = True) -> list:
+    """
+    Runs every benchmark against a started MockOrchestrator
+
+        Returns:
+            (list) A list of BenchResult
+    """
+    client = VcoClient(orchestrator_url=mock.url, api_key=APIKEY)
+
+    return [
+        _measure(bench_single, client, memory, calls=calls),
+        _measure(bench_fanout, client, memory, workers=workers),
+        _measure(bench_long_series, client, memory, days=days),
+    ]
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds of server latency per request')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='maximum random seconds added to latency')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of requests answered with a 500')
+    parser.add_argument('--rate-limit', type=float, default=None,
+                        help='requests per second before answering with 429')
+    parser.add_argument('--edges', type=int, default=50, help='edges per enterprise')
+    parser.add_argument('--applications', type=int, default=100, help='applications per edge')
+    parser.add_argument('--calls', type=int, default=100, help='calls for the single benchmark')
+    parser.add_argument('--workers', type=int, default=8, help='threads for the fanout benchmark')
+    parser.add_argument('--days', type=int, default=7, help='interval for the long series benchmark')
+    parser.add_argument('--no-memory', action='store_true', help='skip peak memory measurement')
+    parser.add_argument('--startup-runs', type=int, default=5,
+                        help='fresh interpreters for the startup benchmark, 0 skips it')
+    args = parser.parse_args(argv)
+
+    mock = MockOrchestrator(latency=args.latency,
+                            jitter=args.jitter,
+                            error_rate=args.error_rate,
+                            rate_limit=args.rate_limit,
+                            edges=args.edges,
+                            applications=args.applications)
+
+    with mock:
+        results = run(mock,
+                      calls=args.calls,
+                      workers=args.workers,
+                      days=args.days,
+                      memory=not args.no_memory)
+        startup = bench_startup(mock.url, args.startup_runs) if args.startup_runs else []
+
+    print(HEADER)
+    for result in results:
+        print(result)
+
+    if startup:
+        print()
+        print(STARTUP_HEADER)
+        for result in startup:
+            print(_startup_row(result))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,138 @@
+import os
+import time
+import tempfile
+import logging
+
+log = logging.getLogger(__name__)
+
+_SHM_DIR = '/dev/shm'
+_TMP_PREFIX = '.tmp-'
+
+class FileCache:
+    """
+    A response cache that is shared between every process on a host
+
+    Entries are stored one per file, so any worker that populates a key makes
+    it available to all of the others. Writes go to a temporary file that is
+    then renamed into place, so readers never see a partially written entry.
+
+    ...
+
+    Attributes:
+    -----------
+    directory : str
+        Directory the cache entries are written to. Defaults to a directory
+        private to the current user under /dev/shm (shared memory) when
+        available, otherwise the system temp directory
+    ttl : float
+        Number of seconds an entry remains valid for
+    purge_interval : float
+        Minimum seconds between the purges of expired entries made by set().
+        Defaults to ttl
+
+    """
+    def __init__(self, directory: str = None, ttl: float = 300, purge_interval: float = None):
+        if directory is None:
+            base = _SHM_DIR if os.path.isdir(_SHM_DIR) else tempfile.gettempdir()
+            directory = os.path.join(base, f'vcoclient-cache-{os.getuid()}')
+
+            # Cached responses hold orchestrator data, so other users must not
+            # be able to read them or plant entries
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            if os.stat(directory).st_uid != os.getuid():
+                raise PermissionError(f'{directory} is owned by another user')
+        else:
+            os.makedirs(directory, exist_ok=True)
+
+        self.directory = directory
+        self.ttl = ttl
+        self.purge_interval = ttl if purge_interval is None else purge_interval
+        self._purged = time.monotonic()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str) -> bytes:
+        """
+        Returns the cached value for a key
+
+            Parameters:
+                key (str): The cache key
+
+            Returns:
+                (bytes) The cached value, or None if it is missing or expired
+        """
+        try:
+            with open(self._path(key), 'rb') as cache_file:
+                data = cache_file.read()
+        except FileNotFoundError:
+            return None
+
+        header, _, value = data.partition(b'\n')
+        try:
+            expires = float(header)
+        except ValueError:
+            log.warning('discarding corrupt cache entry %s', key)
+            self.delete(key)
+            return None
+
+        if expires < time.time():
+            self.delete(key)
+            return None
+
+        return value
+
+    def set(self, key: str, value: bytes, ttl: float = None):
+        """
+        Atomically stores a value in the cache
+
+            Parameters:
+                key (str): The cache key
+                value (bytes): The value to be stored
+                ttl (float): Overrides the default ttl for this entry
+        """
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=_TMP_PREFIX)
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                tmp_file.write(f'{expires}\n'.encode())
+                tmp_file.write(value)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+        # Entries that are never read again would otherwise stay forever
+        if time.monotonic() - self._purged >= self.purge_interval:
+            self._purged = time.monotonic()
+            self.purge()
+
+    def delete(self, key: str):
+        """
+        Removes a key from the cache
+        """
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def clear(self):
+        """
+        Removes every entry from the cache
+        """
+        for name in os.listdir(self.directory):
+            if not name.startswith(_TMP_PREFIX):
+                self.delete(name)
+
+    def purge(self):
+        """
+        Removes expired entries from the cache
+        """
+        for name in os.listdir(self.directory):
+            if not name.startswith(_TMP_PREFIX):
+                # get() deletes the entry as a side effect if it has expired
+                self.get(name)
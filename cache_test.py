@@ -0,0 +1,160 @@
+import os
+import stat
+
+from . import cache as cache_module
+from .cache import FileCache
+from .vcoclient import VcoClient
+
+APIKEY = 'abcd'
+ORCHESTRATOR = 'https://localhost'
+
+def test_file_cache_set_get(tmp_path):
+    """
+    Testing storing and retrieving a cache entry
+    """
+    cache = FileCache(directory=str(tmp_path))
+    cache.set('key', b'value')
+
+    assert cache.get('key') == b'value'
+    assert cache.get('missing') is None
+
+def test_file_cache_expired(tmp_path):
+    """
+    Testing that expired entries are not returned and are removed
+    """
+    cache = FileCache(directory=str(tmp_path), ttl=0)
+    cache.set('key', b'value', ttl=-1)
+
+    assert cache.get('key') is None
+    assert not os.path.exists(tmp_path / 'key')
+
+def test_file_cache_shared(tmp_path):
+    """
+    Testing that separate cache instances on the same directory share entries
+    """
+    FileCache(directory=str(tmp_path)).set('key', b'value')
+
+    assert FileCache(directory=str(tmp_path)).get('key') == b'value'
+
+def test_file_cache_no_temp_files(tmp_path):
+    """
+    Testing that atomic writes do not leave temporary files behind
+    """
+    cache = FileCache(directory=str(tmp_path))
+    cache.set('key', b'first')
+    cache.set('key', b'second')
+
+    assert os.listdir(tmp_path) == ['key']
+    assert cache.get('key') == b'second'
+
+def test_file_cache_clear_purge(tmp_path):
+    """
+    Testing clearing and purging the cache
+    """
+    cache = FileCache(directory=str(tmp_path))
+    cache.set('fresh', b'value')
+    cache.set('stale', b'value', ttl=-1)
+
+    cache.purge()
+    assert os.listdir(tmp_path) == ['fresh']
+
+    cache.clear()
+    assert os.listdir(tmp_path) == []
+
+def test_file_cache_purge_on_set(tmp_path):
+    """
+    Testing that set() purges expired entries once purge_interval has passed
+    """
+    cache = FileCache(directory=str(tmp_path), purge_interval=0)
+    cache.set('stale', b'value', ttl=-1)
+    cache.set('fresh', b'value')
+
+    assert os.listdir(tmp_path) == ['fresh']
+
+def test_file_cache_default_directory(monkeypatch, tmp_path):
+    """
+    Testing that the default directory is private to the current user
+    """
+    monkeypatch.setattr(cache_module, '_SHM_DIR', str(tmp_path))
+
+    cache = FileCache()
+
+    assert cache.directory == str(tmp_path / f'vcoclient-cache-{os.getuid()}')
+    assert stat.S_IMODE(os.stat(cache.directory).st_mode) == 0o700
+
+def test_client_cache_hit(requests_mock, tmp_path):
+    """
+    Testing that a cacheable method is only fetched once across clients
+    """
+    test_response = [{"edgeId" : 1}, {"edgeId" : 2}]
+    mock = requests_mock.post(f'{ORCHESTRATOR}/portal/rest/enterprise/getEnterpriseEdges',
+                              json=test_response
+                              )
+
+    cache = FileCache(directory=str(tmp_path))
+    first = VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY, cache=cache)
+    second = VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY, cache=cache)
+
+    assert first.get_enterprise_edges(enterprise_id=1) == test_response
+    assert second.get_enterprise_edges(enterprise_id=1) == test_response
+    assert mock.call_count == 1
+
+    # A different body is a different cache entry
+    assert second.get_enterprise_edges(enterprise_id=2) == test_response
+    assert mock.call_count == 2
+
+def test_client_cache_key_per_credential(requests_mock, tmp_path):
+    """
+    Testing that clients with different api keys do not share entries
+    """
+    mock = requests_mock.post(f'{ORCHESTRATOR}/portal/rest/enterprise/getEnterpriseEdges',
+                              json=[]
+                              )
+
+    cache = FileCache(directory=str(tmp_path))
+    VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY, cache=cache).get_enterprise_edges()
+    VcoClient(orchestrator_url=ORCHESTRATOR, api_key='efgh', cache=cache).get_enterprise_edges()
+
+    assert mock.call_count == 2
+
+def test_client_cache_skips_uncacheable(requests_mock, tmp_path):
+    """
+    Testing that methods outside cache_methods and 404s are not cached
+    """
+    mock = requests_mock.post(f'{ORCHESTRATOR}/portal/rest/test', json={})
+    absent = requests_mock.post(f'{ORCHESTRATOR}/portal/rest/enterprise/getEnterpriseEdges',
+                                status_code=404
+                                )
+
+    cache = FileCache(directory=str(tmp_path))
+    client = VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY, cache=cache)
+
+    client.request('test', {})
+    client.request('test', {})
+    assert client.get_enterprise_edges() is None
+    assert client.get_enterprise_edges() is None
+
+    assert mock.call_count == 2
+    assert absent.call_count == 2
+    assert os.listdir(tmp_path) == []
+
+class BrokenCache:
+    def get(self, key):
+        raise OSError('read-only file system')
+
+    def set(self, key, value):
+        raise OSError('no space left on device')
+
+def test_client_cache_errors(requests_mock):
+    """
+    Testing that cache I/O errors do not fail requests
+    """
+    test_response = [{"edgeId" : 1}]
+    mock = requests_mock.post(f'{ORCHESTRATOR}/portal/rest/enterprise/getEnterpriseEdges',
+                              json=test_response
+                              )
+
+    client = VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY, cache=BrokenCache())
+
+    assert client.get_enterprise_edges(enterprise_id=1) == test_response
+    assert mock.call_count == 1
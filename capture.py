@@ -0,0 +1,145 @@
+import gzip
+import json
+import time
+import zlib
+import base64
+import logging
+import threading
+from collections import deque
+
+from .vcoclient import VcoClient
+
+log = logging.getLogger(__name__)
+
+REST_PREFIX = '/portal/rest/'
+
+def _key(method: str, body: dict) -> tuple:
+    return method, json.dumps(body, sort_keys=True)
+
+class CaptureWriter:
+    """
+    Records orchestrator traffic to an archive file for later replay
+
+    Pass an instance to VcoClient as the capture kwarg. The archive holds one
+    JSON record per line with the method, request body, status, elapsed time
+    and the zlib compressed response content.
+
+    ...
+
+    Attributes:
+    -----------
+    path : str
+        Path of the archive file. Records are appended to an existing archive
+    level : int
+        zlib compression level used for response content
+
+    """
+    def __init__(self, path: str, level: int = 6):
+        self.path = path
+        self.level = level
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def record(self, method: str, body: dict, resp, elapsed: float):
+        """
+        Appends a response to the archive
+
+            Parameters:
+                method (str): API Method that was called
+                body (dict): The request body
+                resp (requests.Response): The orchestrator response
+                elapsed (float): Seconds the request took
+        """
+        content = zlib.compress(resp.content, self.level)
+        line = json.dumps({
+            'method': method,
+            'body': body,
+            'status': resp.status_code,
+            'elapsed': elapsed,
+            'size': len(resp.content),
+            'content': base64.b64encode(content).decode('ascii'),
+        })
+
+        with self._lock:
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ReplayTransport:
+    """
+    Serves responses recorded by a CaptureWriter in place of an orchestrator
+
+    Pass an instance to VcoClient as the transport kwarg. Requests are matched
+    on method and body. When the same request was recorded more than once the
+    recordings are served in order, starting again from the first once they
+    are exhausted.
+
+    ...
+
+    Attributes:
+    -----------
+    path : str
+        Path of the archive file
+    speed : float
+        None replays as fast as possible. Otherwise each response is delayed by
+        its recorded elapsed time divided by speed, so 1.0 is recorded timing
+
+    """
+    def __init__(self, path: str, speed: float = None):
+        self.path = path
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._recordings = {}
+
+        with open(path, encoding='utf-8') as archive:
+            for line in archive:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                key = _key(record['method'], record['body'])
+                self._recordings.setdefault(key, deque()).append(record)
+
+    def __len__(self) -> int:
+        return sum(len(records) for records in self._recordings.values())
+
+    def _next(self, method: str, body: dict) -> dict:
+        key = _key(method, body)
+        with self._lock:
+            records = self._recordings.get(key)
+            if not records:
+                raise KeyError(f'no recording for {method} with body {key[1]}')
+            record = records.popleft()
+            records.append(record)
+        return record
+
+    def post(self, url: str, json: dict = None, data=None, **kwargs):
+        """
+        Returns the recorded response for a request, mirroring requests.post()
+        """
+        method = url.split(REST_PREFIX, 1)[-1]
+        if json is None and data is not None:
+            json = _json_loads(data)
+
+        record = self._next(method, json if json is not None else {})
+
+        if self.speed:
+            time.sleep(record['elapsed'] / self.speed)
+
+        content = zlib.decompress(base64.b64decode(record['content']))
+        return VcoClient._make_response(url, content, record['status'])
+
+def _json_loads(data) -> dict:
+    # Request bodies may have been gzipped by VcoClient.compress_requests
+    if isinstance(data, bytes) and data[:2] == b'\x1f\x8b':
+        data = gzip.decompress(data)
+    return json.loads(data)
@@ -0,0 +1,114 @@
+import json
+import time
+
+import pytest
+from requests.exceptions import HTTPError
+
+from .vcoclient import VcoClient
+from .capture import CaptureWriter, ReplayTransport
+
+APIKEY = 'abcd'
+ORCHESTRATOR = 'https://localhost'
+
+@pytest.fixture
+def archive(requests_mock, tmp_path):
+    """
+    Records a successful, an absent and a failing request to an archive
+    """
+    requests_mock.post(f'{ORCHESTRATOR}/portal/rest/enterprise/getEnterpriseEdges',
+                       json=[{"edgeId" : 1}, {"edgeId" : 2}])
+    requests_mock.post(f'{ORCHESTRATOR}/portal/rest/configuration/'\
+                       'getIdentifiableApplications',
+                       status_code=404)
+    requests_mock.post(f'{ORCHESTRATOR}/portal/rest/test', status_code=503)
+
+    path = str(tmp_path / 'archive.jsonl')
+    with CaptureWriter(path) as capture:
+        client = VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY, capture=capture)
+        client.get_enterprise_edges(enterprise_id=1)
+        client.get_identifiable_applications()
+        with pytest.raises(HTTPError):
+            client.request('test', {"test" : "test"})
+
+    return path
+
+def test_capture_records(archive):
+    """
+    Testing the contents of a capture archive
+    """
+    with open(archive) as archive_file:
+        records = [json.loads(line) for line in archive_file]
+
+    assert [record['method'] for record in records] == [
+        'enterprise/getEnterpriseEdges',
+        'configuration/getIdentifiableApplications',
+        'test']
+    assert [record['status'] for record in records] == [200, 404, 503]
+    assert records[0]['body'] == {"enterpriseId" : 1}
+    assert all(record['elapsed'] >= 0 for record in records)
+
+def test_capture_closed(tmp_path, requests_mock):
+    """
+    Testing that a capture that cannot be written does not fail requests
+    """
+    requests_mock.post(f'{ORCHESTRATOR}/portal/rest/enterprise/getEnterpriseEdges',
+                       json=[{"id" : 1}])
+
+    capture = CaptureWriter(str(tmp_path / 'archive.jsonl'))
+    capture.close()
+    client = VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY, capture=capture)
+
+    assert client.get_enterprise_edges(enterprise_id=1) == [{"id" : 1}]
+
+def test_replay(archive, requests_mock):
+    """
+    Testing that a replayed client behaves like the recorded one without HTTP
+    """
+    client = VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY,
+                       transport=ReplayTransport(archive))
+
+    assert client.get_enterprise_edges(enterprise_id=1) == [{"edgeId" : 1}, {"edgeId" : 2}]
+    assert client.get_identifiable_applications() is None
+    with pytest.raises(HTTPError):
+        client.request('test', {"test" : "test"})
+
+    # Recordings are reused once exhausted
+    assert client.get_enterprise_edges(enterprise_id=1) == [{"edgeId" : 1}, {"edgeId" : 2}]
+    assert requests_mock.call_count == 3
+
+def test_replay_missing(archive):
+    """
+    Testing that replaying an unrecorded request raises a KeyError
+    """
+    client = VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY,
+                       transport=ReplayTransport(archive))
+
+    with pytest.raises(KeyError):
+        client.get_enterprise_edges(enterprise_id=2)
+
+def test_replay_speed(archive):
+    """
+    Testing that replay delays responses by their recorded time over speed
+    """
+    with open(archive) as archive_file:
+        records = [json.loads(line) for line in archive_file]
+    records[0]['elapsed'] = 0.2
+    with open(archive, 'w') as archive_file:
+        archive_file.writelines(json.dumps(record) + '\n' for record in records)
+
+    client = VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY,
+                       transport=ReplayTransport(archive, speed=2.0))
+
+    started = time.perf_counter()
+    client.get_enterprise_edges(enterprise_id=1)
+
+    assert time.perf_counter() - started >= 0.1
+
+def test_replay_compressed_request(archive):
+    """
+    Testing that replay matches gzipped request bodies
+    """
+    client = VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY,
+                       transport=ReplayTransport(archive), compress_requests=0)
+
+    assert client.get_enterprise_edges(enterprise_id=1) == [{"edgeId" : 1}, {"edgeId" : 2}]
@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+import heapq
+import logging
+import itertools
+import contextvars
+from typing import TYPE_CHECKING
+
+from . import tracing
+
+if TYPE_CHECKING: # pragma: no cover
+    from datetime import datetime
+    from .vcoclient import VcoClient
+
+log = logging.getLogger(__name__)
+
+# Only the metrics needed for ranking are requested from the orchestrator
+RANKING_METRICS = {'metrics': ['bytesRx', 'bytesTx', 'flowCount']}
+
+class TopN:
+    """
+    Tracks the n heaviest keys of a weighted stream in bounded memory
+
+    Uses the Space-Saving algorithm: at most capacity keys are tracked and,
+    once full, a new key replaces the lightest tracked key and inherits its
+    count as an overestimate. Counts are exact whenever the number of distinct
+    keys never exceeds capacity. The lightest key is found with a min-heap,
+    so each add costs O(log capacity).
+
+    ...
+
+    Attributes:
+    -----------
+    n : int
+        Number of keys reported by top()
+    capacity : int
+        Maximum number of keys tracked. Defaults to 10 * n
+
+    """
+    def __init__(self, n: int, capacity: int = None):
+        self.n = n
+        self.capacity = max(n, capacity or 10 * n)
+        self._counts = {}
+        self._errors = {}
+        # (count, sequence, key) for every tracked key. Entries are refreshed
+        # lazily, so an entry's count may be lower than the key's count
+        self._heap = []
+        self._sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def add(self, key, weight: float):
+        """
+        Adds weight to a key. Weights must not be negative
+        """
+        counts = self._counts
+        if key in counts:
+            counts[key] += weight
+            return
+
+        heap = self._heap
+        if len(counts) < self.capacity:
+            counts[key] = weight
+            self._errors[key] = 0
+            heapq.heappush(heap, (weight, next(self._sequence), key))
+            return
+
+        # Counts only grow, so a stale entry sorts too early. Refresh stale
+        # entries until the smallest one is current
+        while True:
+            floor, _, evicted = heap[0]
+            if counts[evicted] == floor:
+                break
+            heapq.heapreplace(heap, (counts[evicted], next(self._sequence), evicted))
+
+        del counts[evicted]
+        del self._errors[evicted]
+
+        counts[key] = floor + weight
+        self._errors[key] = floor
+        heapq.heapreplace(heap, (floor + weight, next(self._sequence), key))
+
+    def merge(self, other: 'TopN'):
+        """
+        Adds every key tracked by another TopN
+        """
+        for key, count in other._counts.items():
+            self.add(key, count)
+            self._errors[key] += other._errors[key]
+
+    def top(self) -> list:
+        """
+        Returns the n heaviest keys
+
+            Returns:
+                (list) (key, count, error) tuples, heaviest first. The true
+                count of a key is between count - error and count
+        """
+        ranked = sorted(self._counts.items(), key=lambda item: item[1], reverse=True)
+        return [(key, count, self._errors[key]) for key, count in ranked[:self.n]]
+
+class FleetRanking:
+    """
+    Application rankings for each enterprise and for the whole fleet
+
+    ...
+
+    Attributes:
+    -----------
+    bytes : TopN
+        Applications across the fleet ranked by bytes received and sent
+    flows : TopN
+        Applications across the fleet ranked by flow count
+    enterprises : dict
+        {'bytes': TopN, 'flows': TopN} for each enterprise id
+    edges : int
+        Number of edges whose metrics were merged
+    failed : list
+        (enterprise_id, edge_id, error) for edges whose metrics could not be
+        fetched
+
+    """
+    def __init__(self, n: int, capacity: int = None):
+        self.n = n
+        self.capacity = capacity
+        self.bytes = TopN(n, capacity)
+        self.flows = TopN(n, capacity)
+        self.enterprises = {}
+        self.edges = 0
+        self.failed = []
+
+    def add_edge(self, enterprise_id: int, totals: list):
+        """
+        Merges the (application, bytes, flows) totals for one edge
+        """
+        enterprise = self.enterprises.get(enterprise_id)
+        if enterprise is None:
+            enterprise = self.enterprises[enterprise_id] = {
+                'bytes': TopN(self.n, self.capacity),
+                'flows': TopN(self.n, self.capacity)}
+
+        for app, app_bytes, app_flows in totals:
+            self.bytes.add(app, app_bytes)
+            self.flows.add(app, app_flows)
+            enterprise['bytes'].add(app, app_bytes)
+            enterprise['flows'].add(app, app_flows)
+        self.edges += 1
+
+    def as_dict(self) -> dict:
+        return {
+            'bytes': self.bytes.top(),
+            'flows': self.flows.top(),
+            'enterprises': {enterprise_id: {'bytes': ranking['bytes'].top(),
+                                            'flows': ranking['flows'].top()}
+                            for enterprise_id, ranking in self.enterprises.items()},
+            'edges': self.edges,
+            'failed': self.failed,
+        }
+
+
+def _edge_app_totals(client: VcoClient,
+                     edge_id: int,
+                     start: datetime,
+                     end: datetime,
+                     enterprise_id: int) -> list:
+    """
+    Returns (application, bytes, flows) for every application seen on an edge
+
+    Runs in the pool so only the reduced totals are sent back to the caller.
+    """
+    with tracing.span(client.tracer, 'edge', edge_id=edge_id, enterprise_id=enterprise_id):
+        metrics = client.get_edge_app_metrics(edge_id=edge_id,
+                                              start=start,
+                                              end=end,
+                                              enterprise_id=enterprise_id,
+                                              metrics=RANKING_METRICS)
+
+    totals = []
+    for app in metrics or []:
+        name = app.get('name') or app.get('application')
+        app_bytes = app.get('bytesRx', 0) + app.get('bytesTx', 0)
+        totals.append((name, app_bytes, app.get('flowCount', 0)))
+    return totals
+
+def rank_applications(client: VcoClient,
+                      start: datetime,
+                      end: datetime,
+                      n: int = 10,
+                      enterprise_ids: list = None,
+                      executor=None,
+                      workers: int = 8,
+                      capacity: int = None) -> FleetRanking:
+    """
+    Ranks applications by bytes and flows across every edge of every enterprise
+
+    App metrics are fetched for each edge across a pool and merged into
+    bounded TopN summaries as they arrive. At most 2 * workers responses are
+    in flight at once, so memory stays proportional to n rather than to
+    edges * applications.
+
+    Parameters:
+        client (VcoClient): The client used to query the orchestrator
+        start (datetime): The start of the interval to rank
+        end (datetime): The end of the interval to rank
+        n (int): Number of applications in each ranking
+        enterprise_ids (list): Enterprises to rank. Defaults to every
+                               enterprise returned by
+                               get_enterprise_proxy_enterprises()
+        executor (Executor): A concurrent.futures thread or process pool.
+                             Defaults to a ThreadPoolExecutor of workers threads
+        workers (int): Number of threads when no executor is passed. At most
+                       2 * workers edges are in flight, so pass the size of
+                       the executor when passing one
+        capacity (int): Keys tracked by each TopN, see TopN
+
+    Returns:
+        (FleetRanking) Per enterprise and fleet wide rankings
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    ranking = FleetRanking(n, capacity)
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=workers)
+
+    # Contexts cannot be sent to other processes, so only thread pools see
+    # the fleet span as the parent of each edge span
+    threaded = isinstance(executor, ThreadPoolExecutor)
+
+    def submit(edge_id, enterprise_id):
+        args = (_edge_app_totals, client, edge_id, start, end, enterprise_id)
+        if threaded:
+            return executor.submit(contextvars.copy_context().run, *args)
+        return executor.submit(*args)
+
+    try:
+        with tracing.span(client.tracer, 'fleet', n=n):
+            if enterprise_ids is None:
+                enterprise_ids = [enterprise['id']
+                                  for enterprise in client.get_enterprise_proxy_enterprises() or []]
+
+            pending = {}
+            for enterprise_id in enterprise_ids:
+                for edge in client.get_enterprise_edges(enterprise_id) or []:
+                    if len(pending) >= 2 * workers:
+                        _collect(ranking, pending)
+                    pending[submit(edge['id'], enterprise_id)] = (enterprise_id, edge['id'])
+
+            while pending:
+                _collect(ranking, pending)
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    return ranking
+
+def _collect(ranking: FleetRanking, pending: dict):
+    """
+    Waits for at least one edge to finish and merges every finished edge
+    """
+    from concurrent.futures import FIRST_COMPLETED, wait
+
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+        enterprise_id, edge_id = pending.pop(future)
+        try:
+            ranking.add_edge(enterprise_id, future.result())
+        except Exception as err:
+            log.error('failed to fetch app metrics for edge %s: %s', edge_id, err)
+            ranking.failed.append((enterprise_id, edge_id, repr(err)))
@@ -0,0 +1,185 @@
+import os
+import pickle
+import random
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor
+
+from .vcoclient import VcoClient
+from .mockserver import MockOrchestrator
+from .fleet import TopN, rank_applications
+from .tracing import Tracer, FileExporter
+
+APIKEY = 'abcd'
+ORCHESTRATOR = 'https://localhost'
+
+END = datetime(2021, 4, 4, 12, 0, 0)
+START = END - timedelta(hours=1)
+
+def test_topn_exact():
+    """
+    Testing that counts are exact while keys fit in capacity
+    """
+    top = TopN(2, capacity=4)
+    for key, weight in [('a', 1), ('b', 5), ('a', 10), ('c', 3)]:
+        top.add(key, weight)
+
+    assert top.top() == [('a', 11, 0), ('b', 5, 0)]
+
+def test_topn_bounded():
+    """
+    Testing that memory is bounded and heavy keys survive evictions
+    """
+    top = TopN(1, capacity=3)
+    for key in range(100):
+        top.add('heavy', 10)
+        top.add(key, 1)
+
+    assert len(top) == 3
+    key, count, error = top.top()[0]
+    assert key == 'heavy'
+    assert count - error <= 1000 <= count
+
+def test_topn_evicts_lightest():
+    """
+    Testing that each eviction replaces the lightest key, as a full scan would
+    """
+    rng = random.Random(0)
+    top = TopN(5, capacity=20)
+    counts, errors = {}, {}
+
+    for _ in range(5000):
+        key, weight = rng.randrange(100), rng.random()
+        top.add(key, weight)
+
+        if key in counts:
+            counts[key] += weight
+        elif len(counts) < 20:
+            counts[key], errors[key] = weight, 0
+        else:
+            evicted = min(counts, key=counts.get)
+            floor = counts.pop(evicted)
+            del errors[evicted]
+            counts[key], errors[key] = floor + weight, floor
+
+    assert top._counts == counts
+    assert top._errors == errors
+
+def test_topn_merge():
+    """
+    Testing merging partial results
+    """
+    first, second = TopN(2), TopN(2)
+    first.add('a', 5)
+    second.add('a', 2)
+    second.add('b', 4)
+
+    first.merge(second)
+
+    assert first.top() == [('a', 7, 0), ('b', 4, 0)]
+
+def test_rank_applications(requests_mock):
+    """
+    Testing per enterprise and global rankings across the fleet
+    """
+    requests_mock.post(f'{ORCHESTRATOR}/portal/rest/enterpriseProxy/'\
+                       'getEnterpriseProxyEnterprises',
+                       json=[{"id" : 1}, {"id" : 2}])
+    requests_mock.post(f'{ORCHESTRATOR}/portal/rest/enterprise/getEnterpriseEdges',
+                       [{'json' : [{"id" : 10}, {"id" : 11}]},
+                        {'json' : [{"id" : 20}]}])
+
+    metrics = {
+        10 : [{"name" : "web", "bytesRx" : 10, "bytesTx" : 5, "flowCount" : 1},
+              {"name" : "dns", "bytesRx" : 1, "bytesTx" : 1, "flowCount" : 50}],
+        11 : [{"name" : "web", "bytesRx" : 20, "bytesTx" : 0, "flowCount" : 2}],
+    }
+
+    def app_metrics(request, context):
+        body = request.json()
+        assert body['metrics'] == ['bytesRx', 'bytesTx', 'flowCount']
+        if body['edgeId'] == 20:
+            context.status_code = 500
+            return {}
+        return metrics[body['edgeId']]
+
+    requests_mock.post(f'{ORCHESTRATOR}/portal/rest/metrics/getEdgeAppMetrics',
+                       json=app_metrics)
+
+    client = VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY)
+
+    ranking = rank_applications(client, START, END, n=1, workers=2)
+
+    assert ranking.bytes.top() == [('web', 35, 0)]
+    assert ranking.flows.top() == [('dns', 50, 0)]
+    assert ranking.enterprises[1]['bytes'].top() == [('web', 35, 0)]
+    assert 2 not in ranking.enterprises
+    assert ranking.edges == 2
+    assert [failed[:2] for failed in ranking.failed] == [(2, 20)]
+    assert ranking.as_dict()['bytes'] == [('web', 35, 0)]
+
+def test_client_pickle():
+    """
+    Testing that clients can be sent to process pool workers
+    """
+    client = VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY)
+
+    copy = pickle.loads(pickle.dumps(client))
+
+    assert copy.headers == client.headers
+    assert copy.compression_report() == {}
+
+def test_rank_applications_process_pool():
+    """
+    Testing ranking with a process pool against the mock orchestrator
+    """
+    with MockOrchestrator(enterprises=2, edges=3, applications=20) as mock:
+        client = VcoClient(orchestrator_url=mock.url, api_key=APIKEY)
+
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            ranking = rank_applications(client, START, END, n=5, executor=pool)
+
+        threaded = rank_applications(client, START, END, n=5)
+
+    assert ranking.edges == 6
+    assert ranking.failed == []
+    assert len(ranking.bytes.top()) == 5
+    assert sorted(ranking.enterprises) == [1, 2]
+    assert ranking.as_dict() == threaded.as_dict()
+
+def test_rank_applications_spans():
+    """
+    Testing that edge spans in worker threads are children of the fleet span
+    """
+    spans = []
+    exporter = type('ListExporter', (), {'export' : lambda self, span: spans.append(span)})()
+
+    with MockOrchestrator(enterprises=1, edges=2, applications=5) as mock:
+        client = VcoClient(orchestrator_url=mock.url, api_key=APIKEY,
+                           tracer=Tracer(exporter))
+        rank_applications(client, START, END, n=5)
+
+    fleet = [span for span in spans if span.name == 'fleet'][0]
+    edges = [span for span in spans if span.name == 'edge']
+
+    assert len(edges) == 2
+    assert all(span.parent_id == fleet.span_id for span in edges)
+
+def test_rank_applications_process_pool_tracer():
+    """
+    Testing that a client with a tracer can be sent to process pool workers
+    """
+    spans = []
+
+    with MockOrchestrator(enterprises=1, edges=2, applications=5) as mock, \
+         FileExporter(os.devnull) as exporter:
+        exporter.export = spans.append
+        client = VcoClient(orchestrator_url=mock.url, api_key=APIKEY,
+                           tracer=Tracer(exporter))
+
+        with ProcessPoolExecutor(max_workers=2) as pool:
+            ranking = rank_applications(client, START, END, n=5, executor=pool)
+
+    assert ranking.edges == 2
+    assert ranking.failed == []
+    # Spans from the workers are dropped rather than failing the edges
+    assert [span.name for span in spans if span.name != 'request'] == ['fleet']
@@ -0,0 +1,369 @@
+import gzip
+import json
+import time
+import zlib
+import random
+import logging
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+log = logging.getLogger(__name__)
+
+REST_PREFIX = '/portal/rest/'
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.000Z'
+
+# Seconds between points in a generated time series
+TICK_INTERVAL = 300
+
+LINK_METRICS = ['bytesRx', 'bytesTx', 'bestLatencyMsRx', 'bestLatencyMsTx',
+                'bestJitterMsRx', 'bestJitterMsTx', 'bestLossPctRx', 'bestLossPctTx']
+APP_METRICS = ['bytesRx', 'bytesTx', 'packetsRx', 'packetsTx', 'totalBytes',
+               'totalPackets', 'flowCount']
+
+class MockOrchestrator:
+    """
+    An in-process stand-in for a Velocloud orchestrator
+
+    Serves synthetic responses for the /portal/rest/* endpoints that VcoClient
+    calls, from a background thread on localhost. Responses are deterministic
+    for a given request, so repeated runs produce the same payloads.
+
+    ...
+
+    Attributes:
+    -----------
+    latency : float
+        Seconds to wait before answering each request
+    jitter : float
+        Maximum number of seconds randomly added to latency
+    error_rate : float
+        Fraction of requests (0 - 1) answered with a 500 error
+    rate_limit : float
+        Maximum requests per second before answering with 429. None disables
+        rate limiting
+    retry_after : int
+        Value of the Retry-After header sent with 429 responses
+    enterprises : int
+        Number of enterprises returned to a partner
+    edges : int
+        Number of edges in each enterprise
+    links : int
+        Number of WAN links on each edge
+    applications : int
+        Number of applications reported by each edge
+    compress_min : int
+        Gzip responses at least this many bytes long when the client accepts
+        gzip. None never compresses responses
+    headers : dict
+        Extra headers sent with every response, e.g. Set-Cookie
+    requests : dict
+        Number of requests received, by method
+    last_headers : dict
+        Headers of the most recent request
+
+    """
+    def __init__(self,
+                 latency: float = 0.0,
+                 jitter: float = 0.0,
+                 error_rate: float = 0.0,
+                 rate_limit: float = None,
+                 retry_after: int = 1,
+                 enterprises: int = 2,
+                 edges: int = 10,
+                 links: int = 2,
+                 applications: int = 50,
+                 compress_min: int = 1024,
+                 headers: dict = None,
+                 host: str = '127.0.0.1',
+                 port: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.retry_after = retry_after
+        self.enterprises = enterprises
+        self.edges = edges
+        self.links = links
+        self.applications = applications
+        self.compress_min = compress_min
+        self.headers = headers or {}
+        self.requests = {}
+        self.last_headers = None
+
+        self._lock = threading.Lock()
+        # Burst size of the token bucket. At least one request is let through
+        # so that rate limits below one per second still serve requests
+        self._burst = None if rate_limit is None else max(1, rate_limit)
+        self._tokens = self._burst
+        self._refilled = time.monotonic()
+        self._random = random.Random(0)
+
+        self._handlers = {
+            'enterpriseProxy/getEnterpriseProxyEnterprises': self._enterprises,
+            'enterprise/getEnterpriseEdges': self._enterprise_edges,
+            'configuration/getIdentifiableApplications': self._identifiable_applications,
+            'edge/getEdgeConfigurationStack': self._configuration_stack,
+            'metrics/getEdgeLinkSeries': self._link_series,
+            'metrics/getEdgeAppSeries': self._app_series,
+            'metrics/getEdgeAppMetrics': self._app_metrics,
+            'event/getEnterpriseEvents': self._enterprise_events,
+        }
+
+        self._server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """
+        Base URL to pass to VcoClient as the orchestrator_url
+        """
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """
+        Starts serving requests from a background thread
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        kwargs={'poll_interval': 0.05},
+                                        name='mock-orchestrator',
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops the server and waits for the background thread to exit
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _throttled(self) -> bool:
+        """
+        Token bucket rate limiter. Returns True when a request should get a 429
+        """
+        if self.rate_limit is None:
+            return False
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self._burst,
+                               self._tokens + (now - self._refilled) * self.rate_limit)
+            self._refilled = now
+
+            if self._tokens < 1:
+                return True
+
+            self._tokens -= 1
+            return False
+
+    def handle(self, method: str, body: dict) -> tuple:
+        """
+        Returns the (status, payload) for a request to the given method
+        """
+        with self._lock:
+            self.requests[method] = self.requests.get(method, 0) + 1
+            failed = self._random.random() < self.error_rate
+            delay = self.latency + self._random.uniform(0, self.jitter)
+
+        if self._throttled():
+            return 429, {'error': {'code': 429, 'message': 'rate limit exceeded'}}
+
+        if delay:
+            time.sleep(delay)
+
+        if failed:
+            return 500, {'error': {'code': 500, 'message': 'internal error'}}
+
+        handler = self._handlers.get(method)
+        if handler is None:
+            return 404, {'error': {'code': 404, 'message': f'unknown method {method}'}}
+
+        try:
+            return 200, handler(body)
+        except (KeyError, TypeError, ValueError) as err:
+            return 400, {'error': {'code': 400, 'message': f'invalid request: {err}'}}
+
+    @staticmethod
+    def _ticks(body: dict) -> tuple:
+        """
+        Returns the start time in ms and number of points for a body's interval
+        """
+        interval = body.get('interval', {})
+        try:
+            start = datetime.strptime(interval['start'], TIMESTAMP_FORMAT)
+            end = datetime.strptime(interval['end'], TIMESTAMP_FORMAT)
+        except (KeyError, ValueError):
+            return 0, 1
+
+        # Orchestrator timestamps are UTC, whatever the host's timezone
+        points = max(1, int((end - start).total_seconds()) // TICK_INTERVAL)
+        return int(start.replace(tzinfo=timezone.utc).timestamp() * 1000), points
+
+    @staticmethod
+    def _edge_id(body: dict) -> int:
+        """
+        Returns the edgeId of a body, which edge methods require
+        """
+        edge_id = body.get('edgeId')
+        if not isinstance(edge_id, int):
+            raise ValueError('edgeId must be an integer')
+        return edge_id
+
+    @staticmethod
+    def _rng(*seed) -> random.Random:
+        return random.Random(':'.join(str(part) for part in seed))
+
+    def _enterprises(self, body: dict) -> list:
+        return [{'id': enterprise_id, 'name': f'enterprise-{enterprise_id}'}
+                for enterprise_id in range(1, self.enterprises + 1)]
+
+    def _enterprise_edges(self, body: dict) -> list:
+        enterprise_id = body.get('enterpriseId', 1)
+        first = (enterprise_id - 1) * self.edges + 1
+        return [{'id': edge_id,
+                 'name': f'edge-{edge_id}',
+                 'enterpriseId': enterprise_id,
+                 'edgeState': 'CONNECTED'}
+                for edge_id in range(first, first + self.edges)]
+
+    def _identifiable_applications(self, body: dict) -> dict:
+        return {'applications': [{'id': app_id, 'name': f'app-{app_id}'}
+                                 for app_id in range(1, self.applications + 1)]}
+
+    def _configuration_stack(self, body: dict) -> list:
+        edge_id = self._edge_id(body)
+        return [{'id': edge_id * 2 + offset,
+                 'name': name,
+                 'modules': [{'name': module, 'data': {}}
+                             for module in ('deviceSettings', 'firewall', 'QOS', 'WAN')]}
+                for offset, name in enumerate(('Edge Specific Profile', 'Profile'))]
+
+    def _series(self, rng: random.Random, metrics: list, start: int, points: int) -> list:
+        return [{'metric': metric,
+                 'startTime': start,
+                 'tickInterval': TICK_INTERVAL * 1000,
+                 'data': [round(rng.random() * 1000, 2) for _ in range(points)]}
+                for metric in metrics]
+
+    def _link_series(self, body: dict) -> list:
+        edge_id = self._edge_id(body)
+        metrics = body.get('metrics', LINK_METRICS)
+        start, points = self._ticks(body)
+        rng = self._rng('link', edge_id, start, points)
+
+        return [{'linkId': edge_id * 100 + link,
+                 'link': {'edgeId': edge_id, 'interface': f'GE{link + 1}'},
+                 'series': self._series(rng, metrics, start, points)}
+                for link in range(self.links)]
+
+    def _app_series(self, body: dict) -> list:
+        edge_id = self._edge_id(body)
+        metrics = body.get('metrics', APP_METRICS)
+        apps = body.get('applications') or range(1, self.applications + 1)
+        start, points = self._ticks(body)
+        rng = self._rng('app', edge_id, start, points)
+
+        return [{'application': app_id,
+                 'name': f'app-{app_id}',
+                 'series': self._series(rng, metrics, start, points)}
+                for app_id in apps]
+
+    def _app_metrics(self, body: dict) -> list:
+        edge_id = self._edge_id(body)
+        metrics = body.get('metrics', APP_METRICS)
+        start, points = self._ticks(body)
+        rng = self._rng('metrics', edge_id, start, points)
+
+        result = []
+        for app_id in range(1, self.applications + 1):
+            item = {'application': app_id, 'name': f'app-{app_id}'}
+            item.update({metric: rng.randint(0, 10 ** 6) * points for metric in metrics})
+            result.append(item)
+        return result
+
+    def _enterprise_events(self, body: dict) -> dict:
+        start, points = self._ticks(body)
+        rng = self._rng('events', body.get('enterpriseId'), body.get('edgeId'), start)
+
+        data = [{'id': event_id,
+                 'eventTime': start + event_id * TICK_INTERVAL * 1000,
+                 'event': rng.choice(['LINK_DEAD', 'LINK_ALIVE', 'EDGE_UP']),
+                 'severity': 'INFO',
+                 'message': 'synthetic event'}
+                for event_id in range(points)]
+        return {'metaData': {'limit': len(data), 'more': False}, 'data': data}
+
+
+def _make_handler(mock: MockOrchestrator):
+    """
+    Returns a request handler class bound to a MockOrchestrator
+    """
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        # Headers and body are written separately, which stalls on delayed
+        # ACKs once connections are kept alive
+        disable_nagle_algorithm = True
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            raw = self.rfile.read(length)
+            mock.last_headers = dict(self.headers)
+            if not self.path.startswith(REST_PREFIX):
+                self._send(404, {'error': {'code': 404, 'message': 'not found'}})
+                return
+
+            if self.headers.get('Content-Encoding') == 'gzip':
+                try:
+                    raw = gzip.decompress(raw)
+                except (OSError, EOFError, zlib.error):
+                    self._send(400, {'error': {'code': 400, 'message': 'invalid gzip body'}})
+                    return
+
+            try:
+                body = json.loads(raw) if raw else {}
+            except ValueError:
+                body = None
+            if not isinstance(body, dict):
+                self._send(400, {'error': {'code': 400, 'message': 'invalid JSON'}})
+                return
+
+            status, payload = mock.handle(self.path[len(REST_PREFIX):], body)
+            self._send(status, payload)
+
+        def _send(self, status: int, payload):
+            content = json.dumps(payload).encode()
+            accepted = self.headers.get('Accept-Encoding', '')
+            compress = (mock.compress_min is not None
+                        and len(content) >= mock.compress_min
+                        and 'gzip' in accepted)
+            if compress:
+                content = gzip.compress(content, compresslevel=5)
+
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            if compress:
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(content)))
+            if status == 429:
+                self.send_header('Retry-After', str(mock.retry_after))
+            for name, value in mock.headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            log.debug(format, *args)
+
+    return Handler
@@ -0,0 +1,192 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+from requests.exceptions import HTTPError
+
+from .vcoclient import VcoClient
+from .mockserver import MockOrchestrator
+from . import bench
+
+APIKEY = 'abcd'
+
+END = datetime(2021, 4, 4, 12, 0, 0)
+START = END - timedelta(hours=1)
+
+@pytest.fixture
+def mock():
+    with MockOrchestrator(edges=3, links=2, applications=4) as server:
+        yield server
+
+def test_mock_orchestrator_edges(mock):
+    """
+    Testing that the mock serves enterprise edges to a real client
+    """
+    client = VcoClient(orchestrator_url=mock.url, api_key=APIKEY)
+
+    edges = client.get_enterprise_edges(enterprise_id=2)
+
+    assert [edge['id'] for edge in edges] == [4, 5, 6]
+    assert mock.requests == {'enterprise/getEnterpriseEdges': 1}
+
+def test_mock_orchestrator_link_series(mock):
+    """
+    Testing that series size follows the interval and requested metrics
+    """
+    client = VcoClient(orchestrator_url=mock.url, api_key=APIKEY)
+
+    series = client.get_edge_link_series(edge_id=1, start=START, end=END,
+                                         metrics={'metrics': ['bytesRx']})
+
+    assert len(series) == 2
+    assert [item['metric'] for item in series[0]['series']] == ['bytesRx']
+    assert len(series[0]['series'][0]['data']) == 12
+
+    # Responses are deterministic
+    assert client.get_edge_link_series(edge_id=1, start=START, end=END,
+                                       metrics={'metrics': ['bytesRx']}) == series
+
+def test_mock_orchestrator_unknown_method(mock):
+    """
+    Testing that unknown methods get a 404
+    """
+    client = VcoClient(orchestrator_url=mock.url, api_key=APIKEY)
+
+    assert client.request('unknown/method', {}) is None
+
+def test_mock_orchestrator_errors():
+    """
+    Testing that error_rate produces 500 responses
+    """
+    with MockOrchestrator(error_rate=1.0) as mock:
+        client = VcoClient(orchestrator_url=mock.url, api_key=APIKEY)
+
+        with pytest.raises(HTTPError):
+            client.get_enterprise_edges()
+
+def test_mock_orchestrator_bad_requests(mock):
+    """
+    Testing that malformed requests get a 400 rather than a dropped connection
+    """
+    url = f'{mock.url}/portal/rest/metrics/getEdgeLinkSeries'
+
+    assert requests.post(url, json={}).status_code == 400
+    assert requests.post(url, json={"edgeId" : "1"}).status_code == 400
+    assert requests.post(url, json=[1]).status_code == 400
+    assert requests.post(url, data=b'not gzip',
+                         headers={'Content-Encoding' : 'gzip'}).status_code == 400
+
+    client = VcoClient(orchestrator_url=mock.url, api_key=APIKEY)
+    with pytest.raises(HTTPError):
+        client.request('edge/getEdgeConfigurationStack', {})
+
+def test_mock_orchestrator_utc(monkeypatch):
+    """
+    Testing that generated timestamps do not depend on the host's timezone
+    """
+    body = {'interval' : {'start' : '2021-04-04T10:00:00.000Z',
+                          'end' : '2021-04-04T11:00:00.000Z'}}
+
+    monkeypatch.setenv('TZ', 'America/New_York')
+    time.tzset()
+    try:
+        assert MockOrchestrator._ticks(body) == (1617530400000, 12)
+    finally:
+        monkeypatch.undo()
+        time.tzset()
+
+def test_mock_orchestrator_rate_limit():
+    """
+    Testing that exceeding rate_limit produces 429 responses with Retry-After
+    """
+    with MockOrchestrator(rate_limit=2, retry_after=5) as mock:
+        statuses = [requests.post(f'{mock.url}/portal/rest/enterprise/getEnterpriseEdges',
+                                  json={})
+                    for _ in range(4)]
+
+    assert statuses[0].status_code == 200
+    assert statuses[-1].status_code == 429
+    assert statuses[-1].headers['Retry-After'] == '5'
+
+def test_mock_orchestrator_rate_limit_burst():
+    """
+    Testing that rate limits below one request per second still serve requests
+    """
+    with MockOrchestrator(rate_limit=0.5) as mock:
+        statuses = [requests.post(f'{mock.url}/portal/rest/enterprise/getEnterpriseEdges',
+                                  json={}).status_code
+                    for _ in range(2)]
+
+    assert statuses == [200, 429]
+
+def test_bench_run(mock):
+    """
+    Testing that the benchmark suite runs and reports every benchmark
+    """
+    results = bench.run(mock, calls=3, workers=2, days=1, memory=True)
+
+    assert [result.name for result in results] == ['single', 'fanout', 'long-series']
+    assert results[0].calls == 3
+    assert results[1].calls == 6
+    assert all(result.errors == 0 for result in results)
+    assert all(result.peak_memory > 0 for result in results)
+    assert results[0].p99 >= results[0].p50 > 0
+
+def test_bench_run_errors():
+    """
+    Testing that injected errors are counted rather than failing the setup
+    """
+    with MockOrchestrator(edges=3, error_rate=0.3) as mock:
+        results = bench.run(mock, calls=10, workers=2, days=1, memory=False)
+        startup = bench.bench_startup(mock.url, runs=3)
+
+    assert results[1].calls == 6
+    assert sum(result.errors for result in results) > 0
+    assert all(result.calls == 3 for result in startup)
+
+def test_bench_result_percentile():
+    """
+    Testing nearest rank percentiles
+    """
+    result = bench.BenchResult('test', 1.0, [float(value) for value in range(100, 0, -1)], 0)
+
+    assert result.p50 == 50.0
+    assert result.p99 == 99.0
+    assert result.rps == 100.0
+
+def test_mock_orchestrator_compression():
+    """
+    Testing that large responses are gzipped and reported as such
+    """
+    with MockOrchestrator(applications=200, compress_min=1024) as mock:
+        client = VcoClient(orchestrator_url=mock.url, api_key=APIKEY,
+                           compress_requests=0)
+
+        series = client.get_edge_app_series(edge_id=1, start=START, end=END)
+
+    report = client.compression_report()['metrics/getEdgeAppSeries']
+
+    assert len(series) == 200
+    assert report['encodings'] == {'gzip' : 1}
+    assert report['wire_bytes'] < report['decoded_bytes']
+
+def test_bench_startup(mock):
+    """
+    Testing the cold start benchmark
+    """
+    imported, first_call = bench.bench_startup(mock.url, runs=1)
+
+    assert imported.calls == first_call.calls == 1
+    assert imported.p50 > 0 and first_call.p50 > 0
+
+def test_shared_session_no_cookies():
+    """
+    Testing that cookies set for one client are not sent by another
+    """
+    with MockOrchestrator(headers={'Set-Cookie' : 'velocloud.session=tenantA; Path=/'}) as mock:
+        VcoClient(orchestrator_url=mock.url, api_key=APIKEY).get_enterprise_edges()
+        VcoClient(orchestrator_url=mock.url, api_key='efgh').get_enterprise_edges()
+
+    assert mock.last_headers['Authorization'] == 'Token efgh'
+    assert 'Cookie' not in mock.last_headers
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+import logging
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING: # pragma: no cover
+    from datetime import datetime
+    from .vcoclient import VcoClient
+
+log = logging.getLogger(__name__)
+
+# Query endpoint -> VcoClient method
+ENDPOINTS = {
+    'link_series': 'get_edge_link_series',
+    'app_series': 'get_edge_app_series',
+    'app_metrics': 'get_edge_app_metrics',
+}
+
+AGGREGATES = {
+    'sum': sum,
+    'min': min,
+    'max': max,
+    'mean': lambda data: sum(data) / len(data),
+}
+
+class Query:
+    """
+    A declaration of the metrics a job needs from one edge over one interval
+
+    ...
+
+    Attributes:
+    -----------
+    endpoint : str
+        One of link_series, app_series or app_metrics
+    edge_id : int
+        The velocloud ID for an edge
+    start : datetime
+        The start of the interval
+    end : datetime
+        The end of the interval
+    metrics : tuple
+        The metrics the job needs
+    enterprise_id : int
+        The velocloud ID for an enterprise
+    applications : tuple
+        Application IDs the job needs. None means every application. Not
+        valid for link_series
+    aggregate : str
+        Optionally reduce each series to one value with sum, min, max or mean
+
+    """
+    def __init__(self,
+                 endpoint: str,
+                 edge_id: int,
+                 start: datetime,
+                 end: datetime,
+                 metrics: list,
+                 enterprise_id: int = 0,
+                 applications: list = None,
+                 aggregate: str = None):
+        if endpoint not in ENDPOINTS:
+            raise ValueError(f'endpoint must be one of {", ".join(ENDPOINTS)}')
+        if not metrics:
+            raise ValueError('at least one metric is required')
+        if aggregate is not None and aggregate not in AGGREGATES:
+            raise ValueError(f'aggregate must be one of {", ".join(AGGREGATES)}')
+        if aggregate is not None and endpoint == 'app_metrics':
+            raise ValueError('app_metrics are already aggregated over the interval')
+        if applications is not None and endpoint == 'link_series':
+            raise ValueError('link_series cannot be filtered by application')
+
+        self.endpoint = endpoint
+        self.edge_id = edge_id
+        self.start = start
+        self.end = end
+        self.metrics = tuple(metrics)
+        self.enterprise_id = enterprise_id
+        self.applications = None if applications is None else tuple(applications)
+        self.aggregate = aggregate
+
+    @property
+    def call_key(self) -> tuple:
+        """
+        Queries with the same call_key are served by one orchestrator call
+        """
+        return (self.endpoint, self.enterprise_id, self.edge_id, self.start, self.end)
+
+    def project(self, response: list) -> list:
+        """
+        Returns the part of a merged response that this query asked for
+        """
+        if response is None:
+            return None
+
+        wanted = set(self.metrics)
+        apps = None if self.applications is None else set(self.applications)
+
+        result = []
+        for item in response:
+            if apps is not None and item.get('application') not in apps:
+                continue
+
+            if self.endpoint == 'app_metrics':
+                result.append({key: value for key, value in item.items()
+                               if key in wanted or key in ('application', 'name')})
+                continue
+
+            series = [entry for entry in item.get('series', [])
+                      if entry.get('metric') in wanted]
+            projected = {key: value for key, value in item.items() if key != 'series'}
+
+            if self.aggregate is None:
+                projected['series'] = series
+            else:
+                reduce = AGGREGATES[self.aggregate]
+                projected['metrics'] = {}
+                for entry in series:
+                    data = [value for value in entry.get('data') or [] if value is not None]
+                    projected['metrics'][entry['metric']] = reduce(data) if data else None
+            result.append(projected)
+        return result
+
+class PlannedCall:
+    """
+    One orchestrator call serving every query that shares its edge and interval
+
+    ...
+
+    Attributes:
+    -----------
+    endpoint : str
+        The query endpoint
+    edge_id : int
+        The velocloud ID for an edge
+    enterprise_id : int
+        The velocloud ID for an enterprise
+    start : datetime
+        The start of the interval
+    end : datetime
+        The end of the interval
+    metrics : list
+        The union of the metrics the queries need, sorted
+    applications : list
+        The union of the applications the queries need, or None for every
+        application
+    queries : list
+        The queries served by this call
+
+    """
+    def __init__(self, queries: list):
+        first = queries[0]
+        self.endpoint = first.endpoint
+        self.edge_id = first.edge_id
+        self.enterprise_id = first.enterprise_id
+        self.start = first.start
+        self.end = first.end
+        self.queries = queries
+        self.metrics = sorted({metric for query in queries for metric in query.metrics})
+
+        if any(query.applications is None for query in queries):
+            self.applications = None
+        else:
+            self.applications = sorted({app for query in queries for app in query.applications})
+
+    def kwargs(self) -> dict:
+        """
+        Returns the keyword arguments for the VcoClient method
+        """
+        kwargs = {'edge_id': self.edge_id,
+                  'start': self.start,
+                  'end': self.end,
+                  'enterprise_id': self.enterprise_id,
+                  'metrics': {'metrics': self.metrics}}
+
+        # getEdgeAppMetrics has no application filter, those queries are
+        # filtered locally instead
+        if self.endpoint == 'app_series' and self.applications is not None:
+            kwargs['applications'] = {'applications': self.applications}
+        return kwargs
+
+    def execute(self, client: VcoClient) -> list:
+        method = getattr(client, ENDPOINTS[self.endpoint])
+        return method(**self.kwargs())
+
+class QueryPlanner:
+    """
+    Collects queries from many jobs and serves them with as few, as small,
+    orchestrator calls as possible
+
+    Queries for the same endpoint, edge and interval are merged into a single
+    call that requests only the union of their metrics and applications. Each
+    query then receives just the part of the response it declared.
+    """
+    def __init__(self):
+        self.queries = []
+
+    def add(self, query: Query) -> Query:
+        """
+        Adds a query to the plan and returns it, for use as a key into the
+        results of execute()
+        """
+        self.queries.append(query)
+        return query
+
+    def plan(self) -> list:
+        """
+        Returns the PlannedCalls needed to serve every query
+        """
+        grouped = {}
+        for query in self.queries:
+            grouped.setdefault(query.call_key, []).append(query)
+        return [PlannedCall(queries) for queries in grouped.values()]
+
+    def execute(self, client: VcoClient, executor=None) -> dict:
+        """
+        Runs the plan and returns each query's result
+
+            Parameters:
+                client (VcoClient): The client used to query the orchestrator
+                executor (Executor): Optional ThreadPoolExecutor to make
+                                     the calls in parallel
+
+            Returns:
+                (dict) The projected response for each Query
+        """
+        calls = self.plan()
+        log.debug('serving %d queries with %d calls', len(self.queries), len(calls))
+
+        if executor is None:
+            responses = [call.execute(client) for call in calls]
+        else:
+            responses = list(executor.map(lambda call: call.execute(client), calls))
+
+        return {query: query.project(response)
+                for call, response in zip(calls, responses)
+                for query in call.queries}
@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from .vcoclient import VcoClient
+from .mockserver import MockOrchestrator
+from .query import Query, QueryPlanner
+
+APIKEY = 'abcd'
+ORCHESTRATOR = 'https://localhost'
+
+END = datetime(2021, 4, 4, 12, 0, 0)
+START = END - timedelta(hours=1)
+
+LINK_SERIES = [{"linkId" : 1,
+                "series" : [{"metric" : "bytesRx", "data" : [1, 2, None]},
+                            {"metric" : "bytesTx", "data" : [4, 5, 6]},
+                            {"metric" : "bestLatencyMsRx", "data" : [7, 8, 9]}]}]
+
+def test_query_validation():
+    """
+    Testing that invalid queries are rejected
+    """
+    with pytest.raises(ValueError):
+        Query('unknown', 1, START, END, ['bytesRx'])
+    with pytest.raises(ValueError):
+        Query('link_series', 1, START, END, [])
+    with pytest.raises(ValueError):
+        Query('link_series', 1, START, END, ['bytesRx'], aggregate='median')
+    with pytest.raises(ValueError):
+        Query('app_metrics', 1, START, END, ['bytesRx'], aggregate='sum')
+    with pytest.raises(ValueError):
+        Query('link_series', 1, START, END, ['bytesRx'], applications=[1])
+
+def test_plan_merges_queries():
+    """
+    Testing that queries sharing an edge and interval share a call
+    """
+    planner = QueryPlanner()
+    planner.add(Query('app_series', 1, START, END, ['bytesRx'], applications=[3]))
+    planner.add(Query('app_series', 1, START, END, ['bytesTx', 'bytesRx'], applications=[1]))
+    planner.add(Query('app_series', 2, START, END, ['bytesRx']))
+    planner.add(Query('app_series', 2, START, END, ['flowCount'], applications=[1]))
+
+    first, second = planner.plan()
+
+    assert first.metrics == ['bytesRx', 'bytesTx']
+    assert first.kwargs()['applications'] == {'applications' : [1, 3]}
+    assert len(first.queries) == 2
+
+    assert second.metrics == ['bytesRx', 'flowCount']
+    assert second.applications is None
+    assert 'applications' not in second.kwargs()
+
+def test_execute_link_series(requests_mock):
+    """
+    Testing that one minimal request serves every query's projection
+    """
+    mock = requests_mock.post(f'{ORCHESTRATOR}/portal/rest/metrics/getEdgeLinkSeries',
+                              json=LINK_SERIES)
+
+    planner = QueryPlanner()
+    raw = planner.add(Query('link_series', 1, START, END, ['bytesRx'], enterprise_id=1))
+    total = planner.add(Query('link_series', 1, START, END, ['bytesRx', 'bytesTx'],
+                              enterprise_id=1, aggregate='sum'))
+
+    client = VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY)
+    results = planner.execute(client)
+
+    assert mock.call_count == 1
+    assert mock.last_request.json()['metrics'] == ['bytesRx', 'bytesTx']
+    assert mock.last_request.json()['enterpriseId'] == 1
+
+    assert results[raw] == [{"linkId" : 1,
+                             "series" : [{"metric" : "bytesRx", "data" : [1, 2, None]}]}]
+    assert results[total] == [{"linkId" : 1,
+                               "metrics" : {"bytesRx" : 3, "bytesTx" : 15}}]
+
+def test_execute_absent(requests_mock):
+    """
+    Testing that a 404 gives every query a None result
+    """
+    requests_mock.post(f'{ORCHESTRATOR}/portal/rest/metrics/getEdgeLinkSeries',
+                       status_code=404)
+
+    planner = QueryPlanner()
+    query = planner.add(Query('link_series', 1, START, END, ['bytesRx']))
+
+    client = VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY)
+
+    assert planner.execute(client) == {query : None}
+
+def test_execute_mock_orchestrator():
+    """
+    Testing app queries in parallel against the mock orchestrator
+    """
+    planner = QueryPlanner()
+    series = planner.add(Query('app_series', 1, START, END, ['bytesRx'],
+                               applications=[2], aggregate='max'))
+    metrics = planner.add(Query('app_metrics', 1, START, END, ['flowCount'],
+                                applications=[1, 2]))
+    other = planner.add(Query('app_metrics', 2, START, END, ['bytesTx']))
+
+    with MockOrchestrator(applications=5) as mock:
+        client = VcoClient(orchestrator_url=mock.url, api_key=APIKEY)
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            results = planner.execute(client, executor=pool)
+
+    assert [item['application'] for item in results[series]] == [2]
+    assert list(results[series][0]['metrics']) == ['bytesRx']
+    assert [sorted(item) for item in results[metrics]] == [['application', 'flowCount', 'name']] * 2
+    assert len(results[other]) == 5
+    assert mock.requests == {'metrics/getEdgeAppSeries' : 1, 'metrics/getEdgeAppMetrics' : 2}
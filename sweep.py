@@ -0,0 +1,506 @@
+from __future__ import annotations
+
+import os
+import time
+import socket
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import TYPE_CHECKING
+
+from . import tracing
+from .query import ENDPOINTS
+
+if TYPE_CHECKING: # pragma: no cover
+    from .vcoclient import VcoClient
+
+log = logging.getLogger(__name__)
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    enterprise_id INTEGER NOT NULL,
+    edge_id INTEGER NOT NULL,
+    endpoint TEXT NOT NULL,
+    interval_start TEXT NOT NULL,
+    interval_end TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    retry_at REAL,
+    error TEXT,
+    UNIQUE (enterprise_id, edge_id, endpoint, interval_start, interval_end)
+);
+CREATE INDEX IF NOT EXISTS items_status ON items (status, lease_expires);
+"""
+
+class WorkItem:
+    """
+    One (enterprise, edge, endpoint, interval) unit of a sweep
+
+    ...
+
+    Attributes:
+    -----------
+    id : int
+        Row id of the item in the queue
+    enterprise_id : int
+        The velocloud ID for an enterprise
+    edge_id : int
+        The velocloud ID for an edge
+    endpoint : str
+        One of the query.ENDPOINTS names, e.g. link_series
+    start : datetime
+        The start of the interval
+    end : datetime
+        The end of the interval
+    attempts : int
+        Number of times the item has been leased, including this one
+    owner : str
+        The worker holding the lease
+
+    """
+    def __init__(self, row: tuple, owner: str):
+        (self.id, self.enterprise_id, self.edge_id, self.endpoint,
+         start, end, self.attempts) = row
+        self.start = datetime.fromisoformat(start)
+        self.end = datetime.fromisoformat(end)
+        self.owner = owner
+
+    def __repr__(self) -> str:
+        return (f'WorkItem(id={self.id}, enterprise_id={self.enterprise_id}, '
+                f'edge_id={self.edge_id}, endpoint={self.endpoint!r})')
+
+    def fetch(self, client: VcoClient):
+        """
+        Calls the VcoClient method for this item and returns its result
+        """
+        method = getattr(client, ENDPOINTS[self.endpoint])
+        return method(edge_id=self.edge_id,
+                      start=self.start,
+                      end=self.end,
+                      enterprise_id=self.enterprise_id)
+
+class SweepQueue:
+    """
+    A durable queue of sweep work items stored in SQLite
+
+    Workers lease items for lease_timeout seconds. An item whose worker dies
+    is leased again once its lease expires, so a crash only costs the items
+    that were in flight. A failed item is retried after an exponential
+    backoff, or after the Retry-After of a 429, and is marked failed once it
+    has failed max_attempts times.
+
+    Any number of threads and processes may share a queue file. Workers on
+    other hosts can share it over a network filesystem with working POSIX
+    locks, using journal_mode='DELETE' since WAL needs shared memory.
+
+    ...
+
+    Attributes:
+    -----------
+    path : str
+        Path of the SQLite database
+    lease_timeout : float
+        Seconds a worker may hold an item before it is handed to another
+    max_attempts : int
+        Number of leases an item gets before it is marked failed
+    retry_backoff : float
+        Seconds before the first retry of a failed item, doubled for each
+        later attempt
+    max_backoff : float
+        Upper bound on the seconds between retries
+    journal_mode : str
+        SQLite journal mode. Defaults to WAL
+
+    """
+    def __init__(self,
+                 path: str,
+                 lease_timeout: float = 300,
+                 max_attempts: int = 3,
+                 retry_backoff: float = 1,
+                 max_backoff: float = 300,
+                 journal_mode: str = 'WAL'):
+        self.path = path
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.journal_mode = journal_mode
+        self._local = threading.local()
+
+        connection = self._connection()
+        connection.executescript(_SCHEMA)
+
+        # Queues created before retries were delayed lack retry_at
+        columns = [row[1] for row in connection.execute('PRAGMA table_info(items)')]
+        if 'retry_at' not in columns:
+            connection.execute('ALTER TABLE items ADD COLUMN retry_at REAL')
+
+    def _connection(self) -> sqlite3.Connection:
+        """
+        Returns a connection for the current thread and process
+        """
+        local = self._local
+        pid = os.getpid()
+        if getattr(local, 'pid', None) != pid:
+            # isolation_level=None leaves transactions to _transaction()
+            local.connection = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            local.connection.execute(f'PRAGMA journal_mode={self.journal_mode}')
+            local.pid = pid
+        return local.connection
+
+    def _transaction(self, statements):
+        """
+        Runs statements(connection) inside a write transaction
+        """
+        connection = self._connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            result = statements(connection)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return result
+
+    def __getstate__(self) -> dict:
+        # Connections are per process, so workers re-open the database
+        state = self.__dict__.copy()
+        del state['_local']
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    def enqueue(self, items) -> int:
+        """
+        Adds work items to the queue. Items already in the queue are skipped,
+        so planning a sweep again after a crash does not duplicate work
+
+            Parameters:
+                items (iterable): (enterprise_id, edge_id, endpoint, start, end)
+                                  tuples
+
+            Returns:
+                (int) The number of items added
+        """
+        rows = []
+        for enterprise_id, edge_id, endpoint, start, end in items:
+            if endpoint not in ENDPOINTS:
+                raise ValueError(f'endpoint must be one of {", ".join(ENDPOINTS)}')
+            rows.append((enterprise_id, edge_id, endpoint, start.isoformat(), end.isoformat()))
+
+        def insert(connection):
+            before = connection.total_changes
+            connection.executemany('INSERT OR IGNORE INTO items '
+                                   '(enterprise_id, edge_id, endpoint, interval_start, interval_end) '
+                                   'VALUES (?, ?, ?, ?, ?)', rows)
+            return connection.total_changes - before
+
+        return self._transaction(insert)
+
+    def plan(self,
+             client: VcoClient,
+             endpoints: list,
+             start: datetime,
+             end: datetime,
+             enterprise_ids: list = None,
+             chunk: timedelta = None) -> int:
+        """
+        Enqueues every edge of every enterprise for each endpoint and interval
+
+            Parameters:
+                client (VcoClient): The client used to list enterprises and edges
+                endpoints (list): query.ENDPOINTS names to fetch for each edge
+                start (datetime): The start of the sweep
+                end (datetime): The end of the sweep
+                enterprise_ids (list): Enterprises to sweep. Defaults to every
+                                       enterprise returned by
+                                       get_enterprise_proxy_enterprises()
+                chunk (timedelta): Split the sweep into intervals of this length
+
+            Returns:
+                (int) The number of items added
+        """
+        if chunk is not None and chunk <= timedelta(0):
+            raise ValueError('chunk must be a positive timedelta')
+
+        intervals = []
+        chunk_start = start
+        while chunk_start < end:
+            chunk_end = end if chunk is None else min(end, chunk_start + chunk)
+            intervals.append((chunk_start, chunk_end))
+            chunk_start = chunk_end
+
+        if enterprise_ids is None:
+            enterprise_ids = [enterprise['id']
+                              for enterprise in client.get_enterprise_proxy_enterprises() or []]
+
+        added = 0
+        for enterprise_id in enterprise_ids:
+            edges = client.get_enterprise_edges(enterprise_id) or []
+            added += self.enqueue((enterprise_id, edge['id'], endpoint, interval_start, interval_end)
+                                  for edge in edges
+                                  for endpoint in endpoints
+                                  for interval_start, interval_end in intervals)
+        return added
+
+    def lease(self, owner: str, count: int = 1) -> list:
+        """
+        Leases up to count pending items that are due, or items whose lease
+        has expired
+
+            Parameters:
+                owner (str): Identifies the worker taking the lease
+                count (int): Maximum number of items to lease
+
+            Returns:
+                (list) The leased WorkItems. Empty when nothing is available
+        """
+        def take(connection):
+            now = time.time()
+
+            # Expired leases that have used up their attempts are not retried
+            connection.execute('UPDATE items SET status = ?, error = ?, lease_owner = NULL '
+                               'WHERE status = ? AND lease_expires < ? AND attempts >= ?',
+                               (FAILED, 'lease expired', LEASED, now, self.max_attempts))
+
+            rows = connection.execute(
+                'SELECT id, enterprise_id, edge_id, endpoint, interval_start, interval_end, '
+                'attempts + 1 '
+                'FROM items '
+                'WHERE (status = ? AND (retry_at IS NULL OR retry_at <= ?)) '
+                'OR (status = ? AND lease_expires < ?) '
+                'ORDER BY id LIMIT ?',
+                (PENDING, now, LEASED, now, count)).fetchall()
+
+            connection.executemany(
+                'UPDATE items SET status = ?, lease_owner = ?, lease_expires = ?, '
+                'attempts = attempts + 1 WHERE id = ?',
+                [(LEASED, owner, now + self.lease_timeout, row[0]) for row in rows])
+            return rows
+
+        return [WorkItem(row, owner) for row in self._transaction(take)]
+
+    def renew(self, item: WorkItem) -> bool:
+        """
+        Extends the lease on an item that is taking a long time
+
+            Returns:
+                (bool) False if the lease was lost to another worker
+        """
+        return self._update_leased(item, 'lease_expires = ?', time.time() + self.lease_timeout)
+
+    def complete(self, item: WorkItem) -> bool:
+        """
+        Marks a leased item done
+
+            Returns:
+                (bool) False if the lease was lost to another worker
+        """
+        return self._update_leased(item, 'status = ?, lease_owner = NULL, error = NULL', DONE)
+
+    def fail(self, item: WorkItem, error: str, retry_after: float = None) -> bool:
+        """
+        Returns a leased item to the queue to be retried after a backoff, or
+        marks it failed once it has used up max_attempts
+
+            Parameters:
+                item (WorkItem): The leased item
+                error (str): Description of the failure
+                retry_after (float): Seconds to wait before the retry, e.g. the
+                                     Retry-After of a 429. Defaults to an
+                                     exponential backoff
+
+            Returns:
+                (bool) False if the lease was lost to another worker
+        """
+        status = FAILED if item.attempts >= self.max_attempts else PENDING
+        if retry_after is None:
+            retry_after = min(self.max_backoff, self.retry_backoff * 2 ** (item.attempts - 1))
+
+        return self._update_leased(item, 'status = ?, lease_owner = NULL, error = ?, retry_at = ?',
+                                   status, error, time.time() + retry_after)
+
+    def _update_leased(self, item: WorkItem, assignments: str, *values) -> bool:
+        def update(connection):
+            cursor = connection.execute(f'UPDATE items SET {assignments} '
+                                        'WHERE id = ? AND status = ? AND lease_owner = ?',
+                                        (*values, item.id, LEASED, item.owner))
+            return cursor.rowcount == 1
+
+        return self._transaction(update)
+
+    def retry_failed(self) -> int:
+        """
+        Returns every failed item to the queue with its attempts reset
+
+            Returns:
+                (int) The number of items returned to the queue
+        """
+        def retry(connection):
+            return connection.execute('UPDATE items SET status = ?, attempts = 0, retry_at = NULL '
+                                      'WHERE status = ?', (PENDING, FAILED)).rowcount
+
+        return self._transaction(retry)
+
+    def progress(self) -> dict:
+        """
+        Returns the number of items in each status, plus total and finished
+        (done or failed) counts
+        """
+        rows = self._connection().execute(
+            'SELECT status, COUNT(*) FROM items GROUP BY status').fetchall()
+
+        progress = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        progress.update(rows)
+        progress['total'] = sum(count for _, count in rows)
+        progress['finished'] = progress[DONE] + progress[FAILED]
+        return progress
+
+    def next_due(self) -> float:
+        """
+        Returns the time (seconds since the epoch) at which the next pending
+        item is due or the next lease expires, or None if every item is
+        finished
+        """
+        due, = self._connection().execute(
+            'SELECT MIN(CASE WHEN status = ? THEN COALESCE(retry_at, 0) ELSE lease_expires END) '
+            'FROM items WHERE status IN (?, ?)', (PENDING, PENDING, LEASED)).fetchone()
+        return due
+
+    def failures(self) -> list:
+        """
+        Returns (enterprise_id, edge_id, endpoint, start, end, error) for
+        every failed item
+        """
+        return self._connection().execute(
+            'SELECT enterprise_id, edge_id, endpoint, interval_start, interval_end, error '
+            'FROM items WHERE status = ? ORDER BY id', (FAILED,)).fetchall()
+
+def _retry_after(err: Exception) -> float:
+    """
+    Returns the Retry-After seconds of a 429 error, or None for any other error
+    """
+    from requests.exceptions import HTTPError
+
+    if not isinstance(err, HTTPError) or err.response is None or err.response.status_code != 429:
+        return None
+    try:
+        return float(err.response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return None
+
+class SweepWorker:
+    """
+    Leases items from a SweepQueue, fetches them and hands the results to a
+    handler
+
+    Run one worker per thread, process or host. Each item is only marked done
+    after handler returns, so results must be stored by the handler before
+    it returns.
+
+    ...
+
+    Attributes:
+    -----------
+    queue : SweepQueue
+        The queue to work through
+    client : VcoClient
+        The client used to fetch each item
+    handler : callable
+        Called as handler(item, result) for every fetched item
+    owner : str
+        Identifies this worker's leases. Defaults to host:pid:thread
+    batch_size : int
+        Number of items leased at a time
+    poll_interval : float
+        Maximum seconds to sleep while waiting for items to become due
+
+    """
+    def __init__(self,
+                 queue: SweepQueue,
+                 client: VcoClient,
+                 handler,
+                 owner: str = None,
+                 batch_size: int = 1,
+                 poll_interval: float = 1):
+        self.queue = queue
+        self.client = client
+        self.handler = handler
+        self.owner = owner
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+
+    def run(self, max_items: int = None, wait: bool = True) -> int:
+        """
+        Works until every item in the queue is finished
+
+            Parameters:
+                max_items (int): Stop after this many items
+                wait (bool): Wait for items that are backing off or leased by
+                             other workers, whose leases may yet expire. When
+                             False, return as soon as nothing can be leased
+
+            Returns:
+                (int) The number of items completed
+        """
+        owner = self.owner or f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+        completed = 0
+
+        with tracing.span(self.client.tracer, 'sweep', owner=owner):
+            while max_items is None or completed < max_items:
+                batch = self.batch_size
+                if max_items is not None:
+                    batch = min(batch, max_items - completed)
+
+                items = self.queue.lease(owner, batch)
+                if not items:
+                    due = self.queue.next_due() if wait else None
+                    if due is None:
+                        break
+                    time.sleep(min(self.poll_interval, max(0, due - time.time())))
+                    continue
+
+                for item in items:
+                    completed += self.process(item)
+
+        log.info('worker %s completed %d items: %s', owner, completed, self.queue.progress())
+        return completed
+
+    def process(self, item: WorkItem) -> bool:
+        """
+        Fetches and handles one leased item
+
+            Returns:
+                (bool) True if the item was completed
+        """
+        # Later items of a batch have been waiting since the batch was leased
+        if not self.queue.renew(item):
+            log.warning('%r lost its lease before it was processed', item)
+            return False
+
+        try:
+            with tracing.span(self.client.tracer, 'edge',
+                              enterprise_id=item.enterprise_id,
+                              edge_id=item.edge_id,
+                              endpoint=item.endpoint):
+                self.handler(item, item.fetch(self.client))
+        except Exception as err:
+            log.error('%r failed on attempt %d: %s', item, item.attempts, err)
+            self.queue.fail(item, repr(err), _retry_after(err))
+            return False
+
+        if not self.queue.complete(item):
+            log.warning('%r finished after its lease expired', item)
+            return False
+        return True
@@ -0,0 +1,265 @@
+import time
+import sqlite3
+import multiprocessing
+from datetime import datetime, timedelta
+
+import pytest
+
+from .vcoclient import VcoClient
+from .mockserver import MockOrchestrator
+from . import sweep
+from .sweep import SweepQueue, SweepWorker
+
+APIKEY = 'abcd'
+ORCHESTRATOR = 'https://localhost'
+
+END = datetime(2021, 4, 4, 12, 0, 0)
+START = END - timedelta(hours=2)
+
+def items(count):
+    return [(1, edge_id, 'link_series', START, END) for edge_id in range(count)]
+
+@pytest.fixture
+def queue(tmp_path):
+    return SweepQueue(str(tmp_path / 'sweep.db'), max_attempts=2, retry_backoff=0)
+
+def test_enqueue_idempotent(queue):
+    """
+    Testing that enqueueing the same items twice does not duplicate them
+    """
+    assert queue.enqueue(items(3)) == 3
+    assert queue.enqueue(items(4)) == 1
+    assert queue.progress()['total'] == 4
+
+    with pytest.raises(ValueError):
+        queue.enqueue([(1, 1, 'unknown', START, END)])
+
+def test_plan(queue, requests_mock):
+    """
+    Testing planning a sweep over every edge in chunked intervals
+    """
+    requests_mock.post(f'{ORCHESTRATOR}/portal/rest/enterpriseProxy/'\
+                       'getEnterpriseProxyEnterprises',
+                       json=[{"id" : 1}, {"id" : 2}])
+    requests_mock.post(f'{ORCHESTRATOR}/portal/rest/enterprise/getEnterpriseEdges',
+                       [{'json' : [{"id" : 10}, {"id" : 11}]},
+                        {'json' : [{"id" : 20}]}])
+
+    client = VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY)
+
+    added = queue.plan(client, ['link_series', 'app_metrics'], START, END,
+                       chunk=timedelta(minutes=45))
+
+    # 3 edges * 2 endpoints * 3 intervals
+    assert added == 18
+
+    leased = queue.lease('worker', count=18)
+    assert {(item.start, item.end) for item in leased} == {
+        (START, START + timedelta(minutes=45)),
+        (START + timedelta(minutes=45), START + timedelta(minutes=90)),
+        (START + timedelta(minutes=90), END)}
+
+def test_plan_chunk(queue):
+    """
+    Testing that chunks which would never reach the end are rejected
+    """
+    client = VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY)
+
+    for chunk in (timedelta(0), timedelta(minutes=-5)):
+        with pytest.raises(ValueError):
+            queue.plan(client, ['link_series'], START, END, chunk=chunk)
+
+def test_lease_complete(queue):
+    """
+    Testing that leased items are not handed out twice and can be completed
+    """
+    queue.enqueue(items(3))
+
+    first = queue.lease('first', count=2)
+    second = queue.lease('second', count=2)
+
+    assert [item.edge_id for item in first] == [0, 1]
+    assert [item.edge_id for item in second] == [2]
+    assert queue.lease('third') == []
+
+    assert queue.complete(first[0])
+    assert not queue.complete(first[0])
+
+    assert queue.progress() == {'pending' : 0, 'leased' : 2, 'done' : 1, 'failed' : 0,
+                                'total' : 3, 'finished' : 1}
+
+def test_fail_retry(queue):
+    """
+    Testing that failed items are retried up to max_attempts
+    """
+    queue.enqueue(items(1))
+
+    item, = queue.lease('worker')
+    queue.fail(item, 'first failure')
+    assert queue.progress()['pending'] == 1
+
+    item, = queue.lease('worker')
+    assert item.attempts == 2
+    queue.fail(item, 'second failure')
+
+    assert queue.lease('worker') == []
+    assert queue.failures() == [(1, 0, 'link_series', START.isoformat(),
+                                 END.isoformat(), 'second failure')]
+
+    assert queue.retry_failed() == 1
+    assert queue.lease('worker')[0].attempts == 1
+
+def test_fail_backoff(tmp_path):
+    """
+    Testing that failed items are not leased again until their backoff is over
+    """
+    queue = SweepQueue(str(tmp_path / 'sweep.db'), retry_backoff=0.1)
+    queue.enqueue(items(2))
+
+    first, = queue.lease('worker')
+    queue.fail(first, 'failure')
+
+    # The next item is leased rather than the failed one
+    second, = queue.lease('worker')
+    assert second.id != first.id
+    assert queue.lease('worker') == []
+    assert queue.next_due() == pytest.approx(time.time() + 0.1, abs=0.05)
+
+    time.sleep(0.1)
+    retried, = queue.lease('worker')
+    assert retried.id == first.id
+
+    # The second failure waits twice as long, unless the server says otherwise
+    queue.fail(retried, 'failure')
+    assert queue.next_due() == pytest.approx(time.time() + 0.2, abs=0.05)
+
+def test_worker_retry_after(tmp_path, requests_mock):
+    """
+    Testing that a worker waits for the Retry-After of a 429 and for items
+    leased by other workers
+    """
+    requests_mock.post(f'{ORCHESTRATOR}/portal/rest/metrics/getEdgeLinkSeries',
+                       [{'status_code' : 429, 'headers' : {'Retry-After' : '0.2'}},
+                        {'json' : []}, {'json' : []}])
+
+    queue = SweepQueue(str(tmp_path / 'sweep.db'), lease_timeout=0.1, retry_backoff=60)
+    queue.enqueue(items(2))
+
+    # A crashed peer holds the second item until its lease expires
+    queue.lease('crashed')
+
+    client = VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY)
+    worker = SweepWorker(queue, client, _store, poll_interval=0.05)
+
+    started = time.monotonic()
+    assert worker.run() == 2
+    assert 0.2 <= time.monotonic() - started < 5
+    assert queue.progress()['done'] == 2
+
+def test_queue_upgrade(tmp_path):
+    """
+    Testing that queues created before retries were delayed can be resumed
+    """
+    path = str(tmp_path / 'sweep.db')
+    connection = sqlite3.connect(path)
+    connection.executescript(sweep._SCHEMA.replace('    retry_at REAL,\n', ''))
+    connection.close()
+
+    queue = SweepQueue(path)
+    queue.enqueue(items(1))
+    assert len(queue.lease('worker')) == 1
+
+def test_lease_expiry(tmp_path):
+    """
+    Testing that items held by a dead worker are handed to another worker
+    """
+    queue = SweepQueue(str(tmp_path / 'sweep.db'), lease_timeout=0.05, max_attempts=2)
+    queue.enqueue(items(1))
+
+    dead, = queue.lease('dead')
+    time.sleep(0.1)
+
+    alive, = queue.lease('alive')
+    assert alive.id == dead.id
+    assert not queue.complete(dead)
+    assert not queue.renew(dead)
+    assert queue.renew(alive)
+
+    # Once max_attempts leases have expired the item is failed
+    time.sleep(0.1)
+    assert queue.lease('another') == []
+    assert queue.failures()[0][-1] == 'lease expired'
+
+def test_worker(queue, requests_mock):
+    """
+    Testing that a worker fetches, hands off and completes every item
+    """
+    requests_mock.post(f'{ORCHESTRATOR}/portal/rest/metrics/getEdgeLinkSeries',
+                       [{'json' : [{"linkId" : 1}]}, {'status_code' : 503},
+                        {'json' : [{"linkId" : 3}]}, {'json' : [{"linkId" : 4}]}])
+
+    queue.enqueue(items(3))
+    handled = []
+
+    client = VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY)
+    worker = SweepWorker(queue, client, lambda item, result: handled.append((item.edge_id, result)),
+                         batch_size=2)
+
+    assert worker.run() == 3
+    assert handled == [(0, [{"linkId" : 1}]), (1, [{"linkId" : 3}]), (2, [{"linkId" : 4}])]
+    assert queue.progress()['done'] == 3
+
+def test_worker_renews_batch(tmp_path, requests_mock):
+    """
+    Testing that items later in a batch are not handed to another worker when
+    the batch takes longer than the lease
+    """
+    requests_mock.post(f'{ORCHESTRATOR}/portal/rest/metrics/getEdgeLinkSeries', json=[])
+
+    queue = SweepQueue(str(tmp_path / 'sweep.db'), lease_timeout=0.1)
+    queue.enqueue(items(2))
+    stolen = []
+
+    def handler(item, result):
+        stolen.extend(queue.lease('other', 2))
+        time.sleep(0.15)
+
+    client = VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY)
+    worker = SweepWorker(queue, client, handler, batch_size=2)
+
+    assert worker.run() == 2
+    assert stolen == []
+    assert queue.progress()['done'] == 2
+
+def _store(item, result):
+    pass
+
+def _run_worker(path, url):
+    queue = SweepQueue(path)
+    client = VcoClient(orchestrator_url=url, api_key=APIKEY)
+    SweepWorker(queue, client, _store, poll_interval=0.05).run()
+
+def test_worker_processes(tmp_path):
+    """
+    Testing several worker processes sharing one queue
+    """
+    path = str(tmp_path / 'sweep.db')
+
+    with MockOrchestrator(enterprises=2, edges=5) as mock:
+        client = VcoClient(orchestrator_url=mock.url, api_key=APIKEY)
+        queue = SweepQueue(path)
+        assert queue.plan(client, ['link_series', 'app_metrics'], START, END) == 20
+
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=_run_worker, args=(path, mock.url)) for _ in range(3)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        served = sum(count for method, count in mock.requests.items()
+                     if method.startswith('metrics/'))
+
+    assert all(worker.exitcode == 0 for worker in workers)
+    assert queue.progress()['done'] == 20
+    assert served == 20
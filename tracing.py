@@ -0,0 +1,316 @@
+import abc
+import json
+import time
+import random
+import atexit
+import logging
+import weakref
+import threading
+import contextvars
+
+log = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('vcoclient_span', default=None)
+
+class _NoopSpan:
+    """
+    Stands in for a span that is not being recorded
+
+    Entering it marks the current context as unsampled so that children of an
+    unsampled span are not recorded either.
+    """
+    __slots__ = ('_token',)
+
+    sampled = False
+
+    def __init__(self):
+        self._token = None
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, *exc):
+        _current.reset(self._token)
+        return False
+
+class _DisabledSpan:
+    """
+    Returned when there is no tracer. Does nothing at all
+    """
+    __slots__ = ()
+
+    sampled = False
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+DISABLED = _DisabledSpan()
+
+class Span:
+    """
+    A timed operation within a trace
+
+    Attributes are stored as passed and only formatted by as_dict() when the
+    exporter writes the span out.
+
+    ...
+
+    Attributes:
+    -----------
+    name : str
+        Name of the operation, e.g. sweep, enterprise, edge or request
+    trace_id : int
+        Identifier shared by every span in a trace
+    span_id : int
+        Identifier of this span
+    parent_id : int
+        span_id of the parent span, None for a root span
+    attributes : dict
+        Attributes describing the operation
+    start : float
+        Wall clock start time in seconds since the epoch
+    duration : float
+        Seconds the operation took
+    error : str
+        repr() of the exception raised inside the span, if any
+
+    """
+    __slots__ = ('name', 'trace_id', 'span_id', 'parent_id', 'attributes',
+                 'start', 'duration', 'error', '_tracer', '_token', '_started')
+
+    sampled = True
+
+    def __init__(self, tracer, name: str, trace_id: int, parent_id: int, attributes: dict):
+        self._tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = random.getrandbits(64)
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start = None
+        self.duration = None
+        self.error = None
+
+    def set(self, **attributes):
+        """
+        Adds attributes to the span
+        """
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        self.start = time.time()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.duration = time.perf_counter() - self._started
+        if exc is not None:
+            self.error = repr(exc)
+        _current.reset(self._token)
+        self._tracer.exporter.export(self)
+        return False
+
+    def as_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'trace_id': f'{self.trace_id:016x}',
+            'span_id': f'{self.span_id:016x}',
+            'parent_id': None if self.parent_id is None else f'{self.parent_id:016x}',
+            'start': self.start,
+            'duration': self.duration,
+            'error': self.error,
+            'attributes': {key: value if isinstance(value, (int, float, str, bool, type(None)))
+                           else str(value)
+                           for key, value in self.attributes.items()},
+        }
+
+class _DiscardExporter:
+    """
+    Drops every span. Used by Tracers copied into another process
+    """
+    def export(self, span: Span):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+class Tracer:
+    """
+    Creates parent/child spans and hands finished spans to an exporter
+
+    Sampling is decided once per trace, at the root span; every child of a
+    sampled root is recorded and every child of an unsampled root is not.
+
+    ...
+
+    Attributes:
+    -----------
+    exporter : object
+        Receives finished spans through export(span), e.g. FileExporter
+    sample_rate : float
+        Fraction of traces (0 - 1) that are recorded
+
+    """
+    def __init__(self, exporter, sample_rate: float = 1.0):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    def __getstate__(self) -> dict:
+        # Spans finished in a process pool worker could never reach this
+        # process's exporter, which holds locks and buffered spans that cannot
+        # be pickled anyway. Copies sent to a worker record nothing
+        return {'exporter': _DiscardExporter(), 'sample_rate': 0.0}
+
+    def span(self, name: str, **attributes):
+        """
+        Returns a context manager for a span that is a child of the current span
+
+            Parameters:
+                name (str): Name of the operation
+                **attributes: Attributes describing the operation
+
+            Returns:
+                (Span) A Span, or a no-op span when the trace is not sampled
+        """
+        parent = _current.get()
+        if parent is None:
+            if self.sample_rate < 1 and random.random() >= self.sample_rate:
+                return _NoopSpan()
+            return Span(self, name, random.getrandbits(64), None, attributes)
+
+        if not parent.sampled:
+            # The unsampled root has already marked the context
+            return DISABLED
+
+        return Span(self, name, parent.trace_id, parent.span_id, attributes)
+
+def span(tracer: Tracer, name: str, **attributes):
+    """
+    Returns tracer.span(), or a span that does nothing when tracer is None
+    """
+    if tracer is None:
+        return DISABLED
+    return tracer.span(name, **attributes)
+
+
+# Exporters still holding spans are flushed when the interpreter exits
+_exporters = weakref.WeakSet()
+
+@atexit.register
+def _flush_exporters():
+    for exporter in list(_exporters):
+        exporter.flush()
+
+class _BufferedExporter(abc.ABC):
+    """
+    Buffers finished spans and writes them out in batches
+
+    Buffered spans are written by flush(), close() or when the interpreter
+    exits normally.
+    """
+    def __init__(self, batch_size: int = 100):
+        self.batch_size = batch_size
+        self._buffer = []
+        self._lock = threading.Lock()
+        _exporters.add(self)
+
+    def export(self, span: Span):
+        with self._lock:
+            self._buffer.append(span)
+            if len(self._buffer) < self.batch_size:
+                return
+            batch, self._buffer = self._buffer, []
+        self._write([span.as_dict() for span in batch])
+
+    def flush(self):
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if batch:
+            self._write([span.as_dict() for span in batch])
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @abc.abstractmethod
+    def _write(self, spans: list):
+        """
+        Writes out a batch of formatted spans. Must not raise
+        """
+
+class FileExporter(_BufferedExporter):
+    """
+    Appends spans to a file as JSON lines
+
+    ...
+
+    Attributes:
+    -----------
+    path : str
+        Path of the file spans are appended to
+    batch_size : int
+        Number of spans buffered before they are written
+
+    """
+    def __init__(self, path: str, batch_size: int = 100):
+        super().__init__(batch_size)
+        self.path = path
+        self._file_lock = threading.Lock()
+
+    def _write(self, spans: list):
+        lines = ''.join(json.dumps(span) + '\n' for span in spans)
+        try:
+            with self._file_lock, open(self.path, 'a', encoding='utf-8') as trace_file:
+                trace_file.write(lines)
+        except OSError as err:
+            # Losing spans should never break the traced code
+            log.warning('dropped %d spans: %s', len(spans), err)
+
+class CollectorExporter(_BufferedExporter):
+    """
+    POSTs batches of spans as a JSON list to a collector
+
+    ...
+
+    Attributes:
+    -----------
+    url : str
+        URL of the collector
+    batch_size : int
+        Number of spans buffered before they are sent
+    timeout : float
+        Seconds to wait for the collector
+
+    """
+    def __init__(self, url: str, batch_size: int = 100, timeout: float = 5):
+        super().__init__(batch_size)
+        self.url = url
+        self.timeout = timeout
+
+    def _write(self, spans: list):
+        import requests
+
+        try:
+            requests.post(self.url, json=spans, timeout=self.timeout).raise_for_status()
+        except requests.RequestException as err:
+            # Losing spans should never break the traced code
+            log.warning('dropped %d spans: %s', len(spans), err)
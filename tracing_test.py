@@ -0,0 +1,184 @@
+import json
+
+import pytest
+from requests.exceptions import HTTPError
+
+from .vcoclient import VcoClient
+from . import tracing
+from .tracing import Tracer, FileExporter, CollectorExporter
+
+APIKEY = 'abcd'
+ORCHESTRATOR = 'https://localhost'
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+def test_span_parent_child():
+    """
+    Testing that nested spans share a trace and link to their parent
+    """
+    exporter = ListExporter()
+    tracer = Tracer(exporter)
+
+    with tracer.span('sweep') as sweep:
+        with tracer.span('enterprise', enterprise_id=1) as enterprise:
+            with tracer.span('edge', edge_id=2):
+                pass
+
+    edge, finished_enterprise, finished_sweep = exporter.spans
+
+    assert finished_sweep is sweep and finished_enterprise is enterprise
+    assert sweep.parent_id is None
+    assert enterprise.parent_id == sweep.span_id
+    assert edge.parent_id == enterprise.span_id
+    assert len({span.trace_id for span in exporter.spans}) == 1
+    assert edge.attributes == {'edge_id' : 2}
+    assert edge.duration >= 0
+
+def test_span_error():
+    """
+    Testing that exceptions are recorded and propagated
+    """
+    exporter = ListExporter()
+    tracer = Tracer(exporter)
+
+    with pytest.raises(ValueError):
+        with tracer.span('sweep'):
+            raise ValueError('failed')
+
+    assert exporter.spans[0].error == "ValueError('failed')"
+
+def test_span_unsampled():
+    """
+    Testing that an unsampled root suppresses its whole trace
+    """
+    exporter = ListExporter()
+    tracer = Tracer(exporter, sample_rate=0)
+
+    with tracer.span('sweep') as sweep:
+        with tracer.span('edge') as edge:
+            with tracer.span('request'):
+                edge.set(edge_id=1)
+
+    assert not sweep.sampled and not edge.sampled
+    assert exporter.spans == []
+
+    # The context is restored once the unsampled trace ends
+    tracer.sample_rate = 1
+    with tracer.span('sweep'):
+        pass
+    assert len(exporter.spans) == 1
+
+def test_span_disabled():
+    """
+    Testing the helper for code that may not have a tracer
+    """
+    with tracing.span(None, 'sweep') as span:
+        span.set(edge_id=1)
+
+    assert span is tracing.DISABLED
+
+def test_file_exporter_deferred(tmp_path):
+    """
+    Testing that spans are only formatted when a batch is written
+    """
+    class Attribute:
+        formatted = 0
+
+        def __str__(self):
+            Attribute.formatted += 1
+            return 'attribute'
+
+    path = tmp_path / 'trace.jsonl'
+    exporter = FileExporter(str(path), batch_size=2)
+    tracer = Tracer(exporter)
+
+    with tracer.span('first', value=Attribute()):
+        pass
+    assert Attribute.formatted == 0
+    assert not path.exists()
+
+    with tracer.span('second'):
+        pass
+    with tracer.span('third'):
+        pass
+    exporter.close()
+
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [span['name'] for span in spans] == ['first', 'second', 'third']
+    assert spans[0]['attributes'] == {'value' : 'attribute'}
+    assert Attribute.formatted == 1
+
+def test_file_exporter_failure(tmp_path):
+    """
+    Testing that an unwritable trace file does not raise
+    """
+    exporter = FileExporter(str(tmp_path / 'missing' / 'trace.jsonl'), batch_size=1)
+
+    with Tracer(exporter).span('sweep'):
+        pass
+
+def test_file_exporter_flushed_at_exit(tmp_path):
+    """
+    Testing that spans still buffered at exit are written
+    """
+    path = tmp_path / 'trace.jsonl'
+    exporter = FileExporter(str(path))
+
+    with Tracer(exporter).span('sweep'):
+        pass
+    tracing._flush_exporters()
+
+    assert json.loads(path.read_text())['name'] == 'sweep'
+
+def test_collector_exporter(requests_mock):
+    """
+    Testing that spans are posted to a collector in batches
+    """
+    mock = requests_mock.post('https://collector/spans', json={})
+    exporter = CollectorExporter('https://collector/spans', batch_size=10)
+    tracer = Tracer(exporter)
+
+    with tracer.span('sweep'):
+        pass
+    exporter.flush()
+
+    assert mock.call_count == 1
+    assert mock.last_request.json()[0]['name'] == 'sweep'
+
+def test_collector_exporter_failure(requests_mock):
+    """
+    Testing that a failing collector does not raise
+    """
+    requests_mock.post('https://collector/spans', status_code=503)
+    exporter = CollectorExporter('https://collector/spans', batch_size=1)
+
+    with Tracer(exporter).span('sweep'):
+        pass
+
+def test_client_request_spans(requests_mock):
+    """
+    Testing that client requests are recorded as children of the caller's span
+    """
+    requests_mock.post(f'{ORCHESTRATOR}/portal/rest/enterprise/getEnterpriseEdges',
+                       json=[])
+    requests_mock.post(f'{ORCHESTRATOR}/portal/rest/test', status_code=503)
+
+    exporter = ListExporter()
+    tracer = Tracer(exporter)
+    client = VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY, tracer=tracer)
+
+    with tracer.span('sweep') as sweep:
+        client.get_enterprise_edges(enterprise_id=1)
+        with pytest.raises(HTTPError):
+            client.request('test', {})
+
+    edges, failed, _ = exporter.spans
+
+    assert edges.parent_id == sweep.span_id
+    assert edges.attributes == {'method' : 'enterprise/getEnterpriseEdges', 'status' : 200}
+    assert failed.error is not None
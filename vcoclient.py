@@ -1,12 +1,107 @@
-import requests
+from __future__ import annotations
+
 import os
+import json
+import time
 import logging
-import uuid
-from datetime import datetime, timedelta, time
-from requests.exceptions import HTTPError
+import threading
+from typing import TYPE_CHECKING
+
+# requests, uuid and friends are imported when first needed, so that short
+# lived collectors only pay for what they use
+if TYPE_CHECKING: # pragma: no cover
+    from datetime import datetime
+    import requests
 
 log = logging.getLogger(__name__)
 
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+# Connections kept open to each orchestrator by the shared session
+POOL_SIZE = 32
+
+def shared_session() -> requests.Session:
+    """
+    Returns the requests.Session shared by every VcoClient in this process
+
+    Sharing one session lets clients reuse open connections (and TLS sessions)
+    to an orchestrator rather than starting a new one for every call. The
+    session never stores cookies, so clients using different api keys cannot
+    see each other's. A forked child process gets a session of its own.
+    """
+    global _session, _session_pid
+
+    pid = os.getpid()
+    if _session is not None and _session_pid == pid:
+        return _session
+
+    with _session_lock:
+        if _session is None or _session_pid != pid:
+            import requests
+            from http.cookiejar import DefaultCookiePolicy
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            adapter = HTTPAdapter(pool_maxsize=POOL_SIZE)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+
+            _session, _session_pid = session, pid
+    return _session
+
+# Methods whose responses change slowly enough to be served from a cache
+CACHEABLE_METHODS = frozenset({
+    'enterpriseProxy/getEnterpriseProxyEnterprises',
+    'enterprise/getEnterpriseEdges',
+    'configuration/getIdentifiableApplications',
+    'edge/getEdgeConfigurationStack',
+})
+
+class TransferStats:
+    """
+    Running byte counts for one orchestrator method
+
+    ...
+
+    Attributes:
+    -----------
+    calls : int
+        Number of responses received
+    sent_bytes : int
+        Request body bytes sent, after any compression
+    wire_bytes : int
+        Response bytes received on the wire, before decoding
+    decoded_bytes : int
+        Response bytes after decoding
+    encodings : dict
+        Number of responses received per Content-Encoding
+
+    """
+    def __init__(self):
+        self.calls = 0
+        self.sent_bytes = 0
+        self.wire_bytes = 0
+        self.decoded_bytes = 0
+        self.encodings = {}
+
+    @property
+    def ratio(self) -> float:
+        """
+        Decoded bytes per wire byte. Higher is better, 1.0 means uncompressed
+        """
+        return self.decoded_bytes / self.wire_bytes if self.wire_bytes else 1.0
+
+    def as_dict(self) -> dict:
+        return {'calls': self.calls,
+                'sent_bytes': self.sent_bytes,
+                'wire_bytes': self.wire_bytes,
+                'decoded_bytes': self.decoded_bytes,
+                'ratio': self.ratio,
+                'encodings': dict(self.encodings)}
+
 class VcoClient:
     """
     A class that provides a client for interacting with the Velocloud orchestrator_url
@@ -17,6 +112,31 @@ class VcoClient:
     -----------
     orchestrator_url : str
         URL of the velocloud orchestrator
+    cache : object
+        Optional response cache (e.g. cache.FileCache) providing get(key) and
+        set(key, value). Only responses to cache_methods are cached
+    cache_methods : set
+        Methods eligible for caching. Defaults to CACHEABLE_METHODS
+    transport : object
+        Optional object with a requests compatible post() used to send
+        requests (e.g. capture.ReplayTransport). Defaults to shared_session()
+    capture : object
+        Optional recorder (e.g. capture.CaptureWriter) that every orchestrator
+        response is passed to
+    accept_encoding : str
+        Value of the Accept-Encoding header sent with every request. Defaults
+        to every encoding the installed urllib3 can decode
+    prewarm : bool
+        Open a connection to the orchestrator from a background thread, so it
+        is ready by the time the first request is made. Defaults to False
+    tracer : object
+        Optional tracing.Tracer. Each request is recorded as a span that is a
+        child of the caller's current span
+    compress_requests : int
+        Gzip request bodies at least this many bytes long. Defaults to None,
+        which never compresses request bodies
+    transfer_stats : dict
+        TransferStats for each method called, see compression_report()
 
     """
     def __init__(self, orchestrator_url: str, **kwargs):
@@ -31,6 +151,113 @@ class VcoClient:
             'Content-Type' : 'application/json'
         }
         self.vco = orchestrator_url
+        self.cache = kwargs.get('cache')
+        self.cache_methods = kwargs.get('cache_methods', CACHEABLE_METHODS)
+        self.transport = kwargs.get('transport')
+        self.capture = kwargs.get('capture')
+        self.accept_encoding = kwargs.get('accept_encoding')
+        self.compress_requests = kwargs.get('compress_requests')
+        self.tracer = kwargs.get('tracer')
+        self.transfer_stats = {}
+        self._stats_lock = threading.Lock()
+
+        if kwargs.get('prewarm', False):
+            threading.Thread(target=self.warm, name='vcoclient-prewarm', daemon=True).start()
+
+    def warm(self, timeout: float = 5) -> bool:
+        """
+        Opens a connection to the orchestrator on the shared session so that
+        the first request does not pay for the TCP and TLS handshakes
+
+            Parameters:
+                timeout (float): Seconds to wait for the orchestrator
+
+            Returns:
+                (bool) True if the orchestrator could be reached
+        """
+        if self.transport is not None:
+            return False
+
+        from requests.exceptions import RequestException
+
+        try:
+            shared_session().head(self.vco, timeout=timeout)
+        except RequestException as err:
+            log.debug('failed to prewarm a connection to %s: %s', self.vco, err)
+            return False
+        return True
+
+    def __getstate__(self) -> dict:
+        # Allows clients to be sent to process pool workers. Transfer stats
+        # gathered in a worker stay in that worker
+        state = self.__dict__.copy()
+        del state['_stats_lock']
+        state['transfer_stats'] = {}
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self._stats_lock = threading.Lock()
+
+    def _cache_key(self, method: str, body: dict) -> str:
+        """
+        Returns a cache key unique to the orchestrator, credentials, method and body
+        """
+        key = json.dumps([self.vco, self.headers['Authorization'], method, body],
+                         sort_keys=True)
+        import hashlib
+
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    @staticmethod
+    def _make_response(url: str, content: bytes, status_code: int = 200) -> requests.Response:
+        """
+        Returns a requests.Response wrapping previously fetched content
+        """
+        from http.client import responses
+        from requests.models import Response
+
+        resp = Response()
+        resp.status_code = status_code
+        resp.reason = responses.get(status_code, '')
+        resp.url = url
+        resp.encoding = 'utf-8'
+        resp.headers['Content-Type'] = 'application/json'
+        resp._content = content
+        return resp
+
+    def _record_transfer(self, method: str, sent: int, resp: requests.Response):
+        """
+        Adds a response to the transfer stats for a method
+        """
+        decoded = len(resp.content)
+        try:
+            # urllib3 counts the bytes read from the socket, before decoding
+            wire = resp.raw.tell() or decoded
+        except AttributeError:
+            wire = decoded
+        encoding = resp.headers.get('Content-Encoding', 'identity')
+
+        with self._stats_lock:
+            stats = self.transfer_stats.get(method)
+            if stats is None:
+                stats = self.transfer_stats[method] = TransferStats()
+            stats.calls += 1
+            stats.sent_bytes += sent
+            stats.wire_bytes += wire
+            stats.decoded_bytes += decoded
+            stats.encodings[encoding] = stats.encodings.get(encoding, 0) + 1
+
+    def compression_report(self) -> dict:
+        """
+        Returns wire bytes against decoded bytes for every method called
+
+            Returns:
+                (dict) A dict of TransferStats.as_dict() keyed by method
+        """
+        with self._stats_lock:
+            return {method: stats.as_dict()
+                    for method, stats in self.transfer_stats.items()}
 
     def request(self, method: str, body: dict) -> requests.Response:
         """
@@ -43,23 +270,84 @@ class VcoClient:
             Returns:
                 (requests.Response) A HTTP Response object
         """
-        request_id = uuid.uuid4()
-        log.info(f'request_id: {request_id} - making POST request to '\
-                 f'{self.vco}/portal/rest/{method}'
-                 )
+        if self.tracer is None:
+            return self._request(method, body)
+
+        with self.tracer.span('request', method=method) as span:
+            resp = self._request(method, body)
+            span.set(status=404 if resp is None else resp.status_code)
+            return resp
+
+    def _request(self, method: str, body: dict) -> requests.Response:
+        from requests.exceptions import HTTPError
+
+        url = f'{self.vco}/portal/rest/{method}'
+
+        cache_key = None
+        if self.cache is not None and method in self.cache_methods:
+            cache_key = self._cache_key(method, body)
+            try:
+                content = self.cache.get(cache_key)
+            except OSError as err:
+                # A broken cache should never fail a request
+                log.warning('cache read failed for %s, treating it as a miss: %s', url, err)
+                content = None
+            if content is not None:
+                log.debug('cache hit for %s', url)
+                return self._make_response(url, content)
+
+        # Only pay for a request id when it is going to be logged
+        request_id = None
+        if log.isEnabledFor(logging.INFO):
+            import uuid
+
+            request_id = uuid.uuid4()
+            log.info('request_id: %s - making POST request to %s', request_id, url)
+
+        transport = self.transport or shared_session()
+        if self.accept_encoding is None:
+            from requests.utils import DEFAULT_ACCEPT_ENCODING
+
+            self.accept_encoding = DEFAULT_ACCEPT_ENCODING
+        headers = {**self.headers, 'Accept-Encoding': self.accept_encoding}
+        data = json.dumps(body).encode()
+        if self.compress_requests is not None and len(data) >= self.compress_requests:
+            import gzip
+
+            data = gzip.compress(data)
+            headers['Content-Encoding'] = 'gzip'
+
         try:
-            resp = requests.post(f'{self.vco}/portal/rest/{method}',
-                                 headers=self.headers,
-                                 json=body)
+            started = time.perf_counter()
+            resp = transport.post(url,
+                                  headers=headers,
+                                  data=data)
+            self._record_transfer(method, len(data), resp)
+            if self.capture is not None:
+                try:
+                    self.capture.record(method, body, resp, time.perf_counter() - started)
+                except (OSError, ValueError) as err:
+                    # A broken capture should never fail a request
+                    log.warning('capture failed for %s, dropping the record: %s', url, err)
             resp.raise_for_status()
         except HTTPError as err:
-            log.error(f'request_id: {request_id} - {err}')
+            if request_id is None:
+                import uuid
+
+                request_id = uuid.uuid4()
+            log.error('request_id: %s - %s', request_id, err)
 
             # If it's just a 404 return None
             if resp.status_code == 404:
                 return None
 
             raise err
+
+        if cache_key is not None:
+            try:
+                self.cache.set(cache_key, resp.content)
+            except OSError as err:
+                log.warning('cache write failed for %s: %s', url, err)
         return resp
 
 
@@ -1,9 +1,13 @@
 import os
+import sys
+import gzip
+import json
+import subprocess
 from datetime import datetime, timedelta
 
 import pytest
 from requests.exceptions import HTTPError
-from .vcoclient import VcoClient
+from .vcoclient import VcoClient, shared_session
 
 APIKEY = 'abcd'
 AUTHTOKEN = f'Token {APIKEY}'
@@ -577,3 +581,106 @@ def test_get_edge_app_metrics_absent(requests_mock):
     assert resp is None
     assert mock.called
     assert mock.call_count == 1
+
+def test_request_accept_encoding(requests_mock):
+    """
+    Testing that requests negotiate compressed responses
+    """
+    mock = requests_mock.post(f'{ORCHESTRATOR}/portal/rest/test', json={})
+
+    client = VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY)
+    client.request(method='test', body={})
+
+    assert 'gzip' in mock.last_request.headers['Accept-Encoding']
+    assert 'Content-Encoding' not in mock.last_request.headers
+
+def test_request_compress_body(requests_mock):
+    """
+    Testing that request bodies over compress_requests bytes are gzipped
+    """
+    test_body = {"test" : "test" * 100}
+    mock = requests_mock.post(f'{ORCHESTRATOR}/portal/rest/test', json={})
+
+    client = VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY,
+                       compress_requests=100)
+
+    client.request(method='test', body={"test" : "test"})
+    assert mock.last_request.json() == {"test" : "test"}
+
+    client.request(method='test', body=test_body)
+    assert mock.last_request.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(mock.last_request.body)) == test_body
+
+def test_compression_report(requests_mock):
+    """
+    Testing reporting wire bytes against decoded bytes per method
+    """
+    test_response = [{"edgeId" : edge_id} for edge_id in range(100)]
+    content = json.dumps(test_response).encode()
+    requests_mock.post(f'{ORCHESTRATOR}/portal/rest/enterprise/getEnterpriseEdges',
+                       content=gzip.compress(content),
+                       headers={'Content-Encoding' : 'gzip'}
+                       )
+
+    client = VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY)
+
+    assert client.get_enterprise_edges() == test_response
+    assert client.get_enterprise_edges() == test_response
+
+    report = client.compression_report()['enterprise/getEnterpriseEdges']
+
+    assert report['calls'] == 2
+    assert report['decoded_bytes'] == 2 * len(content)
+    assert report['wire_bytes'] == 2 * len(gzip.compress(content))
+    assert report['ratio'] > 1
+    assert report['encodings'] == {'gzip' : 2}
+    assert report['sent_bytes'] == 4
+
+def test_import_defers_requests():
+    """
+    Testing that importing the package does not import requests
+    """
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    script = f'import sys, {__package__}; print("requests" in sys.modules)'
+
+    output = subprocess.run([sys.executable, '-c', script],
+                            cwd=os.path.dirname(package_dir),
+                            capture_output=True,
+                            check=True,
+                            text=True).stdout
+
+    assert output.strip() == 'False'
+
+def test_shared_session(requests_mock):
+    """
+    Testing that clients share one session for connection reuse
+    """
+    mock = requests_mock.post(f'{ORCHESTRATOR}/portal/rest/test', json={})
+
+    VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY).request('test', {})
+    VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY).request('test', {})
+
+    assert shared_session() is shared_session()
+    assert mock.call_count == 2
+
+def test_warm(requests_mock):
+    """
+    Testing opening a connection ahead of the first request
+    """
+    mock = requests_mock.head(ORCHESTRATOR, status_code=404)
+
+    client = VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY)
+    assert client.warm()
+    assert mock.call_count == 1
+
+    client = VcoClient(orchestrator_url=ORCHESTRATOR, api_key=APIKEY, transport=object())
+    assert not client.warm()
+    assert mock.call_count == 1
+
+def test_warm_unreachable():
+    """
+    Testing that prewarming an unreachable orchestrator fails quietly
+    """
+    client = VcoClient(orchestrator_url='http://127.0.0.1:1', api_key=APIKEY)
+
+    assert not client.warm(timeout=1)